@@ -16,6 +16,12 @@ USE_FREE_GPT = os.getenv('USE_FREE_GPT', 'false').lower() == 'true'
 # Режимы работы бота
 ENABLE_GPT_MODE = os.getenv('ENABLE_GPT_MODE', 'true').lower() == 'true'
 GPT_MODE_THRESHOLD = float(os.getenv('GPT_MODE_THRESHOLD', '0.5'))  # Порог для переключения на GPT
+ENABLE_QA_SHORTCUT = os.getenv('ENABLE_QA_SHORTCUT', 'true').lower() == 'true'  # Ответ из базы без вызова GPT
+QA_SHORTCUT_THRESHOLD = float(os.getenv('QA_SHORTCUT_THRESHOLD', '0.85'))  # Порог уверенности для быстрого ответа
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.85'))  # Сходство вопросов для повторного использования ответа GPT
+SEMANTIC_CACHE_SIZE = int(os.getenv('SEMANTIC_CACHE_SIZE', '1000'))  # Максимум ответов GPT в кэше
+ENABLE_GPT_STREAMING = os.getenv('ENABLE_GPT_STREAMING', 'true').lower() == 'true'  # Показывать ответ GPT по мере генерации
+STREAM_UPDATE_INTERVAL = float(os.getenv('STREAM_UPDATE_INTERVAL', '0.5'))  # Минимальный интервал обновления сообщения (секунды)
 
 # URL магистерских программ ИТМО
 ITMO_AI_URL = "https://abit.itmo.ru/program/master/ai"
@@ -24,9 +30,14 @@ ITMO_AI_PRODUCT_URL = "https://abit.itmo.ru/program/master/ai_product"
 # Настройки базы данных
 DATABASE_PATH = "data/courses.db"
 JSON_DATA_PATH = "data/"
+TFIDF_CACHE_PATH = "data/qa_tfidf.joblib"  # Кэш обученного TF-IDF векторизатора
+COURSES_CACHE_TTL = 30  # Время жизни кэша списков программ, курсов и Q&A (секунды)
+CONTEXT_BLOCK_TTL = 300  # Время жизни готовых блоков контекста GPT (секунды)
+CONTEXT_TOKEN_BUDGET = 2500  # Максимум токенов контекста базы знаний в промпте GPT
 
 # Настройки парсинга
 REQUEST_TIMEOUT = 30
+HTTP_CACHE_PATH = "data/http_cache"  # Кэш ETag/Last-Modified и разобранных программ для условных запросов
 DELAY_BETWEEN_REQUESTS = 1
 
 # Настройки NLP
@@ -37,6 +48,9 @@ MAX_SEQUENCE_LENGTH = 512
 SIMILARITY_THRESHOLD = 0.7
 MIN_RELEVANCE_SCORE = 0.5
 
+# Размер базы вопросов, начиная с которого поиск идет по HNSW индексу (нужен faiss)
+ANN_INDEX_MIN_SIZE = 2000
+
 # Логирование
 LOG_LEVEL = "INFO"
 LOG_FILE = "logs/bot.log" 
\ No newline at end of file
@@ -1,5 +1,5 @@
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import re
 
 from src.database.db_manager import DatabaseManager
@@ -71,8 +71,9 @@ class BotHandler:
             '📊 Сравнить программы': self.handle_program_comparison
         }
     
-    def process_message(self, user_id: int, username: str, message: str) -> Dict:
-        """Основная функция обработки сообщений"""
+    def process_message(self, user_id: int, username: str, message: str,
+                        on_partial: Callable[[str], None] = None) -> Dict:
+        """Основная функция обработки сообщений (on_partial получает ответ GPT по мере генерации)"""
         try:
             # Нормализуем сообщение
             message = message.strip()
@@ -95,10 +96,10 @@ class BotHandler:
             # Проверяем состояние пользователя для многошагового диалога
             user_state = self.user_states.get(user_id, {})
             if user_state.get('state'):
-                return self.handle_state_message(user_id, username, message, user_state)
+                return self.handle_state_message(user_id, username, message, user_state, on_partial)
             
             # Обрабатываем обычный вопрос через Q&A процессор
-            return self.handle_question(user_id, username, message)
+            return self.handle_question(user_id, username, message, on_partial)
             
         except Exception as e:
             logger.error(f"Ошибка при обработке сообщения от {user_id}: {e}")
@@ -340,7 +341,8 @@ class BotHandler:
             'keyboard': self.get_main_keyboard()
         }
     
-    def handle_question(self, user_id: int, username: str, question: str) -> Dict:
+    def handle_question(self, user_id: int, username: str, question: str,
+                        on_partial: Callable[[str], None] = None) -> Dict:
         """Обработка свободного вопроса"""
         # Сначала пробуем базовую Q&A систему
         result = self.qa_processor.get_answer(question)
@@ -366,7 +368,7 @@ class BotHandler:
                 }
             
             # Генерируем умный ответ через внешний GPT
-            gpt_result = self.gpt.generate_smart_answer(question, user_context)
+            gpt_result = self.gpt.generate_smart_answer(question, user_context, on_partial)
             
             if gpt_result.get('is_ai_generated'):
                 response_text = gpt_result['answer']
@@ -429,7 +431,8 @@ class BotHandler:
             'keyboard': keyboard
         }
     
-    def handle_state_message(self, user_id: int, username: str, message: str, user_state: Dict) -> Dict:
+    def handle_state_message(self, user_id: int, username: str, message: str, user_state: Dict,
+                             on_partial: Callable[[str], None] = None) -> Dict:
         """Обработка сообщений в рамках многошагового диалога"""
         state = user_state['state']
         
@@ -446,7 +449,7 @@ class BotHandler:
         
         elif state == 'gpt_mode':
             # GPT режим - отвечаем через внешний или локальный GPT
-            return self.handle_gpt_question(user_id, username, message)
+            return self.handle_gpt_question(user_id, username, message, on_partial)
         
         elif state == 'smart_mode':
             # Локальная умная система
@@ -457,7 +460,7 @@ class BotHandler:
         
         # Сбрасываем состояние если не обработали
         self.user_states.pop(user_id, None)
-        return self.handle_question(user_id, username, message)
+        return self.handle_question(user_id, username, message, on_partial)
     
     def handle_profile_input(self, user_id: int, profile_text: str) -> Dict:
         """Обработка ввода профиля пользователя"""
@@ -728,7 +731,8 @@ class BotHandler:
             'keyboard': [["🔙 Назад в главное меню"]]
         }
     
-    def handle_gpt_question(self, user_id: int, username: str, question: str) -> Dict:
+    def handle_gpt_question(self, user_id: int, username: str, question: str,
+                            on_partial: Callable[[str], None] = None) -> Dict:
         """Обработка вопроса в GPT режиме"""
         if not self.gpt_available:
             return {
@@ -748,7 +752,7 @@ class BotHandler:
                 }
             
             # Генерируем ответ через GPT
-            result = self.gpt.generate_smart_answer(question, user_context)
+            result = self.gpt.generate_smart_answer(question, user_context, on_partial)
             
             response_text = result['answer']
             response_text += f"\n\n🤖 Умный ответ на основе базы знаний ИТМО"
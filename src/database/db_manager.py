@@ -4,8 +4,9 @@ import logging
 from typing import List, Dict, Optional, Tuple
 from dataclasses import asdict
 import os
+import time
 
-from config import DATABASE_PATH
+from config import DATABASE_PATH, COURSES_CACHE_TTL
 from src.parsers.itmo_parser import Course, Program
 
 logging.basicConfig(level=logging.INFO)
@@ -14,10 +15,29 @@ logger = logging.getLogger(__name__)
 class DatabaseManager:
     def __init__(self, db_path: str = DATABASE_PATH):
         self.db_path = db_path
+        # Кэш справочных выборок (программы, курсы, Q&A): между ходами диалога они не меняются
+        self._query_cache: Dict[str, Tuple[float, List[Dict]]] = {}
+        # Версия данных: увеличивается при каждой записи программ и курсов
+        self.data_version = 0
         # Создаем директорию если не существует
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         self.init_database()
     
+    def invalidate_caches(self):
+        """Сброс кэшей после изменения программ или курсов"""
+        self._query_cache.clear()
+        self.data_version += 1
+    
+    def _cached_query(self, key: str, loader) -> List[Dict]:
+        """Результат выборки из кэша (не старше COURSES_CACHE_TTL секунд) или из БД"""
+        cached = self._query_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < COURSES_CACHE_TTL:
+            return list(cached[1])
+        
+        rows = loader()
+        self._query_cache[key] = (time.monotonic(), rows)
+        return list(rows)
+    
     def get_connection(self) -> sqlite3.Connection:
         """Получение соединения с базой данных"""
         conn = sqlite3.Connection(self.db_path)
@@ -124,6 +144,7 @@ class DatabaseManager:
             
             program_id = cursor.lastrowid
             conn.commit()
+            self.invalidate_caches()
             logger.info(f"Программа '{program.name}' добавлена с ID {program_id}")
             return program_id
     
@@ -149,6 +170,7 @@ class DatabaseManager:
             
             course_id = cursor.lastrowid
             conn.commit()
+            self.invalidate_caches()
             return course_id
     
     def insert_programs_with_courses(self, programs: List[Program]):
@@ -162,7 +184,11 @@ class DatabaseManager:
         logger.info(f"Добавлено {len(programs)} программ в базу данных")
     
     def get_all_programs(self) -> List[Dict]:
-        """Получение всех программ"""
+        """Получение всех программ (с кэшированием на COURSES_CACHE_TTL секунд)"""
+        return self._cached_query('programs', self._fetch_all_programs)
+    
+    def _fetch_all_programs(self) -> List[Dict]:
+        """Загрузка всех программ из БД"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('SELECT * FROM programs')
@@ -213,7 +239,11 @@ class DatabaseManager:
             return courses
     
     def get_all_courses(self) -> List[Dict]:
-        """Получение всех курсов"""
+        """Получение всех курсов (с кэшированием на COURSES_CACHE_TTL секунд)"""
+        return self._cached_query('courses', self._fetch_all_courses)
+    
+    def _fetch_all_courses(self) -> List[Dict]:
+        """Загрузка всех курсов из БД"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
@@ -232,6 +262,48 @@ class DatabaseManager:
             
             return courses
     
+    def get_programs_with_sample_courses(self, limit_per_program: int = 5) -> List[Dict]:
+        """Получение всех программ с первыми курсами и общим числом курсов за одно соединение"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM programs')
+            program_rows = cursor.fetchall()
+            
+            cursor.execute('''
+                SELECT * FROM (
+                    SELECT c.*, p.name as program_name,
+                           ROW_NUMBER() OVER (PARTITION BY c.program_id ORDER BY c.id) AS course_rank,
+                           COUNT(*) OVER (PARTITION BY c.program_id) AS program_courses_count
+                    FROM courses c
+                    JOIN programs p ON c.program_id = p.id
+                )
+                WHERE course_rank <= ?
+                ORDER BY program_id, course_rank
+            ''', (limit_per_program,))
+            course_rows = cursor.fetchall()
+            
+            programs = []
+            programs_by_id = {}
+            for row in program_rows:
+                program = dict(row)
+                program['admission_requirements'] = json.loads(program['admission_requirements'])
+                program['career_prospects'] = json.loads(program['career_prospects'])
+                program['courses'] = []
+                program['courses_count'] = 0
+                programs.append(program)
+                programs_by_id[program['id']] = program
+            
+            for row in course_rows:
+                course = dict(row)
+                program = programs_by_id[course['program_id']]
+                program['courses_count'] = course.pop('program_courses_count')
+                course.pop('course_rank')
+                course['tags'] = json.loads(course['tags'])
+                course['prerequisites'] = json.loads(course['prerequisites'])
+                program['courses'].append(course)
+            
+            return programs
+    
     def search_courses_by_tags(self, tags: List[str]) -> List[Dict]:
         """Поиск курсов по тегам"""
         with self.get_connection() as conn:
@@ -282,9 +354,14 @@ class DatabaseManager:
             ))
             
             conn.commit()
+            self._query_cache.pop('qa_pairs', None)
     
     def get_all_qa_pairs(self) -> List[Dict]:
-        """Получение всех пар вопрос-ответ"""
+        """Получение всех пар вопрос-ответ (с кэшированием на COURSES_CACHE_TTL секунд)"""
+        return self._cached_query('qa_pairs', self._fetch_all_qa_pairs)
+    
+    def _fetch_all_qa_pairs(self) -> List[Dict]:
+        """Загрузка всех пар вопрос-ответ из БД"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
@@ -1,15 +1,126 @@
 import os
+import re
+import time
+import functools
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 import json
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 
 from src.database.db_manager import DatabaseManager
 from src.nlp.qa_processor import QAProcessor
+from src.nlp.semantic_cache import SemanticCache
+from config import (
+    ENABLE_QA_SHORTCUT,
+    QA_SHORTCUT_THRESHOLD,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_SIZE,
+    CONTEXT_BLOCK_TTL,
+    CONTEXT_TOKEN_BUDGET,
+    STREAM_UPDATE_INTERVAL
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Ключевые слова тем курсов: одно регулярное выражение вместо перебора списка
+COURSE_KEYWORDS = ['машинное обучение', 'глубокое обучение', 'python', 'данные',
+                   'алгоритм', 'статистика', 'изображение', 'nlp', 'computer vision',
+                   'рекомендательные системы', 'веб-разработка', 'программирование']
+COURSE_KEYWORDS_RE = re.compile('|'.join(map(re.escape, COURSE_KEYWORDS)))
+
+# Быстрая маршрутизация: какие блоки контекста нужны вопросу
+PROGRAMS_INTENT_RE = re.compile(r'программ|магистрат|поступ')
+COURSES_INTENT_RE = re.compile(r'курс|дисциплин|предмет|изуч')
+
+# Справка о поступлении для вопросов о бюджете, экзаменах и стоимости
+ADMISSION_INFO_BLOCK = '\n'.join([
+    "\n=== ИНФОРМАЦИЯ О ПОСТУПЛЕНИИ ===",
+    "📊 Статистика поступления в ИТМО:",
+    "• Магистратура по ИИ - высокий конкурс",
+    "• Требования: портфолио, собеседование, мотивационное письмо",
+    "• Форма обучения: очная, 2 года",
+    "• Язык обучения: русский/английский",
+    "⚠️ ВНИМАНИЕ: Точное количество бюджетных мест и стоимость обучения",
+    "   уточняйте в приемной комиссии ИТМО, так как эта информация",
+    "   изменяется каждый год и зависит от государственного заказа."
+])
+
+# Системные промпты: неизменный префикс запроса позволяет провайдеру кэшировать его
+SYSTEM_PROMPT_QA = """
+Ты - экспертный виртуальный консультант приемной комиссии университета ИТМО по магистерским программам в области искусственного интеллекта.
+
+ТВОЯ РОЛЬ И ЭКСПЕРТИЗА:
+• 🎓 Консультант по магистратуре ИТМО: "Искусственный интеллект" и "AI-продукты"
+• 📚 Эксперт по учебным планам и выбору курсов  
+• 💼 Консультант по карьерным траекториям и трудоустройству
+• 🔍 Помощник в выборе специализации и построении индивидуального пути
+
+КРИТИЧЕСКИ ВАЖНЫЕ ПРАВИЛА:
+✅ ИСПОЛЬЗУЙ ТОЛЬКО предоставленный контекст из базы знаний ИТМО
+✅ Отвечай структурированно, подробно и профессионально  
+✅ Для каждого ответа ссылайся на конкретные программы и курсы из контекста
+✅ Используй эмодзи для лучшего восприятия информации
+✅ Если точной информации нет в контексте - честно скажи об этом и направь к приемной комиссии
+
+❌ НИКОГДА НЕ ВЫДУМЫВАЙ информацию о количестве мест, стоимости, датах поступления
+❌ НЕ используй общие знания об образовании, только данные из предоставленного контекста  
+❌ НЕ давай неточную информацию о поступлении без ссылки на контекст
+
+СТРУКТУРА КАЧЕСТВЕННОГО ОТВЕТА:
+1. 🎯 Прямой ответ на вопрос (если есть в контексте)
+2. 📋 Детальная информация из базы знаний ИТМО  
+3. 💡 Практические рекомендации и следующие шаги
+4. 📞 Контакты для уточнения актуальной информации (если нужно)
+
+КОНТЕКСТ из базы знаний ИТМО будет предоставлен ниже.
+""".strip()
+
+SYSTEM_PROMPT_COMPARE = """
+Ты - консультант по образованию в ИТМО. Сравни программы магистратуры по ИИ.
+
+ЗАДАЧА:
+- Четко объясни различия между программами
+- Для кого подходит каждая программа
+- Ключевые преимущества каждой
+- Помоги сделать выбор
+
+ФОРМАТ:
+🎓 Сравнение программ ИТМО:
+
+📊 КЛЮЧЕВЫЕ РАЗЛИЧИЯ:
+[основные отличия]
+
+👨‍💼 "Искусственный интеллект" - для кого:
+[целевая аудитория и особенности]
+
+🚀 "AI-продукты" - для кого:
+[целевая аудитория и особенности]
+
+💡 Как выбрать:
+[критерии выбора]
+
+Отвечай на русском языке, используй эмодзи.
+""".strip()
+SYSTEM_MESSAGE_COMPARE = {"role": "system", "content": SYSTEM_PROMPT_COMPARE}
+
+# Размер контекстного окна моделей (в токенах)
+MODEL_CONTEXT_LIMITS = {
+    'gpt-3.5-turbo': 16385,
+    'llama3-8b-8192': 8192,
+    'mistralai/Mistral-7B-Instruct-v0.1': 8192
+}
+DEFAULT_CONTEXT_LIMIT = 4096
+RESPONSE_MAX_TOKENS = 1000  # Резерв под ответ модели
+PROMPT_SAFETY_MARGIN = 200  # Запас на служебные токены и погрешность подсчета
+HTTP_POOL_SIZE = 20  # Число keep-alive соединений к каждому API
+
 class FreeGPTIntegration:
     """Интеграция с бесплатными GPT API"""
     
@@ -17,6 +128,36 @@ class FreeGPTIntegration:
         self.db = db_manager or DatabaseManager()
         self.qa_processor = QAProcessor(self.db)
         
+        # Общая HTTP-сессия: keep-alive соединения без повторного TLS-рукопожатия
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        # Готовые блоки контекста о программах: {имя: (версия БД, время сборки, значение)}
+        self._context_blocks = {}
+        
+        # Счетчик ответов, выданных из базы знаний без вызова GPT
+        self.qa_shortcut_hits = 0
+        
+        # Кэш ответов GPT на семантически похожие вопросы
+        self.answer_cache = SemanticCache(
+            self.qa_processor.cache_features,
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            max_size=SEMANTIC_CACHE_SIZE
+        )
+        
+        # Подсчет токенов статичных частей промпта (системный промпт, блоки о программах) кэшируется
+        self._count_tokens_cached = functools.lru_cache(maxsize=256)(self._count_tokens_uncached)
+        
+        # Токенизатор для контроля размера промпта
+        self.encoding = None
+        if tiktoken:
+            try:
+                self.encoding = tiktoken.encoding_for_model('gpt-3.5-turbo')
+            except Exception as e:
+                logger.warning(f"Не удалось загрузить токенизатор tiktoken: {e}")
+        
         # Настройки бесплатных API
         self.free_apis = [
             {
@@ -68,39 +209,14 @@ class FreeGPTIntegration:
                     'Authorization': f"Bearer {os.getenv('HF_API_KEY', '')}"
                 },
                 'auth_required': True,
-                'key_env': 'HF_API_KEY'
+                'key_env': 'HF_API_KEY',
+                'openai_compatible': False
             }
         ]
         
-        # Системный промпт для ИТМО бота  
-        self.system_prompt = """
-Ты - экспертный виртуальный консультант приемной комиссии университета ИТМО по магистерским программам в области искусственного интеллекта.
-
-ТВОЯ РОЛЬ И ЭКСПЕРТИЗА:
-• 🎓 Консультант по магистратуре ИТМО: "Искусственный интеллект" и "AI-продукты"
-• 📚 Эксперт по учебным планам и выбору курсов  
-• 💼 Консультант по карьерным траекториям и трудоустройству
-• 🔍 Помощник в выборе специализации и построении индивидуального пути
-
-КРИТИЧЕСКИ ВАЖНЫЕ ПРАВИЛА:
-✅ ИСПОЛЬЗУЙ ТОЛЬКО предоставленный контекст из базы знаний ИТМО
-✅ Отвечай структурированно, подробно и профессионально  
-✅ Для каждого ответа ссылайся на конкретные программы и курсы из контекста
-✅ Используй эмодзи для лучшего восприятия информации
-✅ Если точной информации нет в контексте - честно скажи об этом и направь к приемной комиссии
-
-❌ НИКОГДА НЕ ВЫДУМЫВАЙ информацию о количестве мест, стоимости, датах поступления
-❌ НЕ используй общие знания об образовании, только данные из предоставленного контекста  
-❌ НЕ давай неточную информацию о поступлении без ссылки на контекст
-
-СТРУКТУРА КАЧЕСТВЕННОГО ОТВЕТА:
-1. 🎯 Прямой ответ на вопрос (если есть в контексте)
-2. 📋 Детальная информация из базы знаний ИТМО  
-3. 💡 Практические рекомендации и следующие шаги
-4. 📞 Контакты для уточнения актуальной информации (если нужно)
-
-КОНТЕКСТ из базы знаний ИТМО будет предоставлен ниже.
-        """.strip()
+        # Системный промпт для ИТМО бота: одно и то же сообщение в каждом запросе
+        self.system_prompt = SYSTEM_PROMPT_QA
+        self._system_message = {"role": "system", "content": SYSTEM_PROMPT_QA}
 
     def is_available(self) -> bool:
         """Проверка доступности хотя бы одного API"""
@@ -118,325 +234,353 @@ class FreeGPTIntegration:
         
         return available
 
-    def call_proxyapi(self, messages: List[Dict]) -> Optional[str]:
-        """Вызов ProxyAPI"""
+    def _call_openai_compatible(self, api: Dict, messages: List[Dict],
+                                on_partial: Callable[[str], None] = None) -> Optional[str]:
+        """Вызов API, совместимого с OpenAI /chat/completions"""
+        name = api['name']
         try:
-            api_key = os.getenv('PROXYAPI_KEY')
-            if not api_key:
-                logger.warning("🚫 ProxyAPI: ключ не найден в окружении")
-                return None
-            
-            logger.info(f"🔑 ProxyAPI: используем ключ {api_key[:20]}...")
-            
-            url = "https://api.proxyapi.ru/openai/v1/chat/completions"
-            
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
+            url = f"{api['base_url']}/chat/completions"
             
             payload = {
-                "model": "gpt-3.5-turbo",
+                "model": api['model'],
                 "messages": messages,
-                "max_tokens": 1000,
+                "max_tokens": RESPONSE_MAX_TOKENS,
                 "temperature": 0.7,
-                "stream": False
+                "stream": on_partial is not None
             }
             
-            logger.info(f"📤 ProxyAPI: отправляем запрос к {url}")
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
-            
-            logger.info(f"📥 ProxyAPI: получен ответ со статусом {response.status_code}")
+            logger.info(f"📤 {name}: отправляем запрос к {url}")
+            response = self.session.post(url, headers=api['headers'], json=payload, timeout=30,
+                                         stream=on_partial is not None)
             
             if response.status_code == 200:
+                # API может проигнорировать stream и вернуть обычный JSON
+                if on_partial is not None and 'text/event-stream' in response.headers.get('Content-Type', ''):
+                    answer = self._read_stream(response, on_partial)
+                    if answer:
+                        logger.info(f"✅ {name}: получен потоковый ответ длиной {len(answer)} символов")
+                        return answer
+                    logger.warning(f"❌ {name}: пустой потоковый ответ")
+                    return None
+                
                 data = response.json()
                 if 'choices' in data and len(data['choices']) > 0:
                     answer = data['choices'][0]['message']['content']
-                    logger.info(f"✅ ProxyAPI: получен ответ длиной {len(answer)} символов")
+                    logger.info(f"✅ {name}: получен ответ длиной {len(answer)} символов")
                     return answer
                 else:
-                    logger.warning(f"❌ ProxyAPI: неожиданный формат ответа: {data}")
+                    logger.warning(f"❌ {name}: неожиданный формат ответа: {data}")
             else:
-                logger.warning(f"❌ ProxyAPI ошибка HTTP {response.status_code}: {response.text[:200]}")
+                logger.warning(f"❌ {name} ошибка HTTP {response.status_code}: {response.text[:200]}")
             
             return None
             
         except Exception as e:
-            logger.error(f"💥 Исключение в ProxyAPI: {type(e).__name__}: {e}")
+            logger.error(f"💥 Исключение в {name}: {type(e).__name__}: {e}")
             return None
 
-    def call_gpt4free(self, messages: List[Dict]) -> Optional[str]:
-        """Вызов GPT4Free API"""
-        try:
-            url = "https://api.g4f.icu/v1/chat/completions"
-            
-            payload = {
-                "model": "gpt-3.5-turbo",
-                "messages": messages,
-                "max_tokens": 1000,
-                "temperature": 0.7,
-                "stream": False
-            }
-            
-            response = requests.post(url, json=payload, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'choices' in data and len(data['choices']) > 0:
-                    return data['choices'][0]['message']['content']
-            
-            logger.warning(f"GPT4Free ошибка: {response.status_code}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Ошибка GPT4Free: {e}")
-            return None
-
-    def call_groq(self, messages: List[Dict]) -> Optional[str]:
-        """Вызов Groq API"""
-        try:
-            if not os.getenv('GROQ_API_KEY'):
-                return None
-            
-            url = "https://api.groq.com/openai/v1/chat/completions"
-            
-            headers = {
-                "Authorization": f"Bearer {os.getenv('GROQ_API_KEY')}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": "llama3-8b-8192",
-                "messages": messages,
-                "max_tokens": 1000,
-                "temperature": 0.7
-            }
-            
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'choices' in data and len(data['choices']) > 0:
-                    return data['choices'][0]['message']['content']
-            
-            logger.warning(f"Groq ошибка: {response.status_code}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Ошибка Groq: {e}")
-            return None
-
-    def call_together(self, messages: List[Dict]) -> Optional[str]:
-        """Вызов Together AI API"""
-        try:
-            if not os.getenv('TOGETHER_API_KEY'):
-                return None
-            
-            url = "https://api.together.xyz/v1/chat/completions"
-            
-            headers = {
-                "Authorization": f"Bearer {os.getenv('TOGETHER_API_KEY')}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "model": "mistralai/Mistral-7B-Instruct-v0.1",
-                "messages": messages,
-                "max_tokens": 1000,
-                "temperature": 0.7
-            }
-            
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'choices' in data and len(data['choices']) > 0:
-                    return data['choices'][0]['message']['content']
-            
-            logger.warning(f"Together ошибка: {response.status_code}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Ошибка Together: {e}")
-            return None
-
-    def try_free_apis(self, messages: List[Dict]) -> Optional[str]:
-        """Попытка использовать бесплатные API по порядку"""
+    def _read_stream(self, response: requests.Response, on_partial: Callable[[str], None]) -> str:
+        """Чтение потокового ответа (server-sent events) с периодической передачей накопленного текста"""
+        parts = []
+        last_update = time.monotonic()
         
-        # Сначала пробуем ProxyAPI (если есть ключ)
-        proxyapi_key = os.getenv('PROXYAPI_KEY')
-        logger.info(f"🔍 Проверяем ProxyAPI ключ: {'есть' if proxyapi_key else 'отсутствует'}")
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            
+            choices = json.loads(data).get('choices') or [{}]
+            delta = choices[0].get('delta', {}).get('content')
+            if not delta:
+                continue
+            parts.append(delta)
+            
+            now = time.monotonic()
+            if now - last_update >= STREAM_UPDATE_INTERVAL:
+                last_update = now
+                on_partial(''.join(parts))
         
-        if proxyapi_key:
-            logger.info("🔄 Пробуем ProxyAPI...")
-            result = self.call_proxyapi(messages)
-            if result:
-                logger.info("✅ ProxyAPI успешно ответил")
-                return result
-            else:
-                logger.warning("❌ ProxyAPI не ответил")
-        else:
-            logger.info("⏭️ Пропускаем ProxyAPI - ключ не найден")
-        
-        # Потом пробуем GPT4Free (не требует ключа)
-        logger.info("🔄 Пробуем GPT4Free...")
-        result = self.call_gpt4free(messages)
-        if result:
-            logger.info("✅ GPT4Free успешно ответил")
-            return result
-        else:
-            logger.warning("❌ GPT4Free не ответил")
-        
-        # Затем пробуем Groq (быстрый и качественный)
-        if os.getenv('GROQ_API_KEY'):
-            logger.info("Пробуем Groq...")
-            result = self.call_groq(messages)
-            if result:
-                logger.info("✅ Groq успешно ответил")
-                return result
+        return ''.join(parts).strip()
+
+    def try_free_apis(self, messages: List[Dict],
+                      on_partial: Callable[[str], None] = None) -> Optional[str]:
+        """Попытка использовать бесплатные API по порядку"""
         
-        # Затем Together AI с Mistral
-        if os.getenv('TOGETHER_API_KEY'):
-            logger.info("Пробуем Together AI...")
-            result = self.call_together(messages)
+        for api in self.get_available_apis():
+            # Hugging Face Inference API не поддерживает формат chat/completions
+            if not api.get('openai_compatible', True):
+                continue
+            
+            logger.info(f"🔄 Пробуем {api['name']}...")
+            result = self._call_openai_compatible(api, messages, on_partial)
             if result:
-                logger.info("✅ Together AI успешно ответил")
+                logger.info(f"✅ {api['name']} успешно ответил")
                 return result
+            logger.warning(f"❌ {api['name']} не ответил")
         
         logger.warning("❌ Все бесплатные API недоступны")
         return None
 
-    def get_relevant_context(self, user_question: str, max_items: int = 10) -> str:
-        """Получение релевантного контекста из базы знаний"""
-        context_parts = []
-        question_lower = user_question.lower()
+    def count_tokens(self, text: str) -> int:
+        """Подсчет токенов в тексте (грубая оценка, если tiktoken недоступен)"""
+        return self._count_tokens_cached(text)
+    
+    def _count_tokens_uncached(self, text: str) -> int:
+        if self.encoding:
+            return len(self.encoding.encode(text))
+        return len(text) // 2
+    
+    def get_prompt_token_limit(self) -> int:
+        """Бюджет токенов на промпт для самой ограниченной из доступных моделей"""
+        limits = [MODEL_CONTEXT_LIMITS[api['model']] for api in self.get_available_apis()
+                  if api['model'] in MODEL_CONTEXT_LIMITS]
+        context_limit = min(limits) if limits else DEFAULT_CONTEXT_LIMIT
+        return context_limit - RESPONSE_MAX_TOKENS - PROMPT_SAFETY_MARGIN
+    
+    def _build_messages(self, relevant_context: str, user_question: str,
+                        user_info: str = None) -> List[Dict]:
+        """Формирование сообщений для GPT"""
+        user_content = f"""
+КОНТЕКСТ из базы знаний ИТМО:
+{relevant_context}
+
+ВОПРОС ПОЛЬЗОВАТЕЛЯ: {user_question}
+
+Ответь на вопрос, используя информацию из контекста. Если точной информации нет, скажи об этом и предложи альтернативы.
+        """.strip()
         
-        # 1. Ищем похожие Q&A
-        qa_result = self.qa_processor.get_answer(user_question)
-        if qa_result['confidence'] > 0.2:
-            context_parts.append(f"Q: {qa_result.get('matched_question', 'Похожий вопрос')}")
-            context_parts.append(f"A: {qa_result['answer']}")
+        # Добавляем информацию о пользователе если есть
+        if user_info:
+            user_content += f"\n\n{user_info}"
         
-        # 2. Получаем связанные вопросы
-        related_qa = self.qa_processor.get_related_questions(user_question, top_k=5)
-        if related_qa:
-            context_parts.append("\n=== ПОХОЖИЕ ВОПРОСЫ ===")
-            for qa in related_qa:
-                context_parts.append(f"Q: {qa['question']}")
-                context_parts.append(f"A: {qa['answer']}")
+        return [
+            self._system_message,
+            {"role": "user", "content": user_content}
+        ]
+    
+    def _count_messages_tokens(self, messages: List[Dict]) -> int:
+        """Подсчет токенов во всех сообщениях"""
+        return sum(self.count_tokens(message['content']) for message in messages)
+    
+    def get_context_token_budget(self, user_question: str, user_info: str = None) -> int:
+        """Бюджет токенов на контекст: лимит промпта за вычетом остальных частей сообщений"""
+        overhead = self._count_messages_tokens(self._build_messages('', user_question, user_info))
+        return max(0, min(CONTEXT_TOKEN_BUDGET, self.get_prompt_token_limit() - overhead))
+    
+    def _get_cached_block(self, name: str, builder):
+        """Готовый блок контекста: пересобирается после записи в БД или по истечении TTL"""
+        now = time.monotonic()
+        cached = self._context_blocks.get(name)
+        if (cached and cached[0] == self.db.data_version and
+                now - cached[1] < CONTEXT_BLOCK_TTL):
+            return cached[2]
         
-        # 3. ДЕТАЛЬНАЯ информация о программах
-        programs = self.db.get_all_programs()
-        context_parts.append("\n=== ПОЛНАЯ ИНФОРМАЦИЯ О ПРОГРАММАХ ИТМО ===")
+        value = builder()
+        self._context_blocks[name] = (self.db.data_version, now, value)
+        return value
+    
+    def _build_programs_block(self) -> Tuple[str, int, int]:
+        """Блок с подробной информацией о программах и их курсах"""
+        # Программы, их первые курсы и число курсов - за один проход по БД
+        programs = self.db.get_programs_with_sample_courses(limit_per_program=15)
+        block_parts = ["\n=== ПОЛНАЯ ИНФОРМАЦИЯ О ПРОГРАММАХ ИТМО ==="]
         
         for program in programs:
-            context_parts.append(f"\n🎓 ПРОГРАММА: {program['name']}")
-            context_parts.append(f"📝 Описание: {program.get('description', '')}")
-            context_parts.append(f"⏱️ Продолжительность: {program.get('duration', '2 года')}")
-            context_parts.append(f"🎯 Уровень: {program.get('level', 'Магистратура')}")
+            block_parts.append(f"\n🎓 ПРОГРАММА: {program['name']}")
+            block_parts.append(f"📝 Описание: {program.get('description', '')}")
+            block_parts.append(f"⏱️ Продолжительность: {program.get('duration', '2 года')}")
+            block_parts.append(f"🎯 Уровень: {program.get('level', 'Магистратура')}")
             
             # Добавляем БОЛЬШЕ курсов программы
-            courses = self.db.get_courses_by_program(program['id'])
+            courses = program['courses']
             if courses:
-                context_parts.append(f"📚 Курсы программы ({len(courses)} курсов):")
-                for course in courses[:15]:  # Увеличиваем до 15 курсов
+                block_parts.append(f"📚 Курсы программы ({program['courses_count']} курсов):")
+                for course in courses:  # До 15 курсов
                     tags_str = ', '.join(course.get('tags', [])[:5])
                     is_mandatory = "ОБЯЗАТЕЛЬНЫЙ" if course.get('is_mandatory') else "ВЫБОРНЫЙ"
-                    context_parts.append(f"  • {course['name']} [{is_mandatory}] (Теги: {tags_str})")
+                    block_parts.append(f"  • {course['name']} [{is_mandatory}] (Теги: {tags_str})")
             
             # Добавляем карьерную информацию если есть
             if program.get('career_info'):
-                context_parts.append(f"💼 Карьера: {program['career_info']}")
+                block_parts.append(f"💼 Карьера: {program['career_info']}")
             
-            context_parts.append("---")
+            block_parts.append("---")
+        
+        total_courses = sum(program['courses_count'] for program in programs)
+        return '\n'.join(block_parts), len(programs), total_courses
+    
+    def _build_comparison_block(self) -> str:
+        """Блок с описанием программ для их сравнения"""
+        programs = self.db.get_programs_with_sample_courses(limit_per_program=8)
+        block_parts = []
+        
+        for program in programs:
+            block_parts.append(f"\n📚 {program['name']}\n")
+            block_parts.append(f"Описание: {program.get('description', '')}\n")
+            block_parts.append(f"Продолжительность: {program.get('duration', '')}\n")
+            
+            if program.get('career_prospects'):
+                block_parts.append(f"Карьерные перспективы: {', '.join(program['career_prospects'])}\n")
+            
+            # Добавляем примеры курсов
+            if program['courses']:
+                block_parts.append("Ключевые курсы:\n")
+                for course in program['courses']:
+                    block_parts.append(f"  - {course['name']}\n")
+            block_parts.append("\n" + "="*50 + "\n")
+        
+        return ''.join(block_parts)
+    
+    def get_relevant_context(self, user_question: str, max_items: int = 10,
+                             qa_result: Dict = None, related_qa: List[Dict] = None,
+                             token_budget: Optional[int] = None) -> str:
+        """Получение релевантного контекста из базы знаний"""
+        # Разделы контекста: (приоритет, текст); при нехватке бюджета первыми отбрасываются наименее важные
+        sections = []
+        question_lower = user_question.lower()
+        
+        # 1. Ищем похожие Q&A и связанные вопросы за один проход
+        if qa_result is None or related_qa is None:
+            qa_result, related_qa = self.qa_processor.query(user_question, top_k=5)
+        if qa_result['confidence'] > 0.2:
+            sections.append((5, f"Q: {qa_result.get('matched_question', 'Похожий вопрос')}\n"
+                                f"A: {qa_result['answer']}"))
+        
+        # 2. Добавляем связанные вопросы
+        if related_qa:
+            related_parts = ["\n=== ПОХОЖИЕ ВОПРОСЫ ==="]
+            for qa in related_qa:
+                related_parts.append(f"Q: {qa['question']}")
+                related_parts.append(f"A: {qa['answer']}")
+            sections.append((4, '\n'.join(related_parts)))
+        
+        # Блоки о программах и курсах нужны, только если о них спрашивают
+        # или база знаний не нашла подходящего ответа
+        needs_courses = COURSES_INTENT_RE.search(question_lower) is not None
+        needs_programs = (needs_courses or qa_result['confidence'] <= 0.2 or
+                          PROGRAMS_INTENT_RE.search(question_lower) is not None)
+        
+        # 3. ДЕТАЛЬНАЯ информация о программах (блок зависит только от содержимого БД)
+        if needs_programs:
+            programs_block, total_programs, total_courses = self._get_cached_block(
+                'programs', self._build_programs_block)
+            sections.append((2, programs_block))
         
         # 4. СПЕЦИАЛЬНАЯ информация для вопросов о поступлении
         admission_keywords = ['бюджет', 'мест', 'поступление', 'требования', 'экзамен', 'стоимость', 'цена']
         if any(keyword in question_lower for keyword in admission_keywords):
-            context_parts.append("\n=== ИНФОРМАЦИЯ О ПОСТУПЛЕНИИ ===")
-            context_parts.append("📊 Статистика поступления в ИТМО:")
-            context_parts.append("• Магистратура по ИИ - высокий конкурс")
-            context_parts.append("• Требования: портфолио, собеседование, мотивационное письмо")
-            context_parts.append("• Форма обучения: очная, 2 года")
-            context_parts.append("• Язык обучения: русский/английский")
-            context_parts.append("⚠️ ВНИМАНИЕ: Точное количество бюджетных мест и стоимость обучения")
-            context_parts.append("   уточняйте в приемной комиссии ИТМО, так как эта информация")
-            context_parts.append("   изменяется каждый год и зависит от государственного заказа.")
+            sections.append((3, ADMISSION_INFO_BLOCK))
         
         # 5. Если вопрос о конкретных курсах, добавляем релевантные курсы  
-        if any(word in question_lower for word in ['курс', 'дисциплина', 'предмет', 'изучение']):
-            all_courses = self.db.get_all_courses()
-            
-            # Поиск по ключевым словам
-            course_keywords = ['машинное обучение', 'глубокое обучение', 'python', 'данные', 
-                             'алгоритм', 'статистика', 'изображение', 'nlp', 'computer vision',
-                             'рекомендательные системы', 'веб-разработка', 'программирование']
+        if needs_courses:
+            # Поиск по ключевым словам: темы вопроса сопоставляются с темами курса
+            question_keywords = set(COURSE_KEYWORDS_RE.findall(question_lower))
             
             relevant_courses = []
-            for course in all_courses:
-                course_text = f"{course['name']} {' '.join(course.get('tags', []))}".lower()
-                for keyword in course_keywords:
-                    if keyword in question_lower and keyword in course_text:
+            if question_keywords:
+                for course in self.db.get_all_courses():
+                    course_text = f"{course['name']} {' '.join(course.get('tags', []))}".lower()
+                    if question_keywords.intersection(COURSE_KEYWORDS_RE.findall(course_text)):
                         relevant_courses.append(course)
-                        break
             
             if relevant_courses:
-                context_parts.append("\n=== СВЯЗАННЫЕ КУРСЫ ===")
+                courses_parts = ["\n=== СВЯЗАННЫЕ КУРСЫ ==="]
                 for course in relevant_courses[:10]:
-                    context_parts.append(f"📖 {course['name']} ({course.get('program_name', 'Неизвестно')})")
+                    courses_parts.append(f"📖 {course['name']} ({course.get('program_name', 'Неизвестно')})")
                     if course.get('tags'):
-                        context_parts.append(f"   Теги: {', '.join(course['tags'])}")
+                        courses_parts.append(f"   Теги: {', '.join(course['tags'])}")
+                sections.append((3, '\n'.join(courses_parts)))
         
         # 6. Добавляем общую статистику
-        total_programs = len(programs)
-        total_courses = len(self.db.get_all_courses()) if hasattr(self.db, 'get_all_courses') else 0
-        context_parts.append(f"\n=== ОБЩАЯ СТАТИСТИКА ===")
-        context_parts.append(f"📊 Всего программ: {total_programs}")
-        context_parts.append(f"📚 Всего курсов: {total_courses}")
-        context_parts.append(f"🏫 Университет: ИТМО (Санкт-Петербург)")
+        if needs_programs:
+            sections.append((1, f"\n=== ОБЩАЯ СТАТИСТИКА ===\n"
+                                f"📊 Всего программ: {total_programs}\n"
+                                f"📚 Всего курсов: {total_courses}\n"
+                                f"🏫 Университет: ИТМО (Санкт-Петербург)"))
         
-        return '\n'.join(context_parts)
-
-    def generate_smart_answer(self, user_question: str, user_context: Dict = None) -> Dict:
-        """Генерация умного ответа через бесплатные GPT API с использованием RAG"""
+        if token_budget is not None:
+            sections = self._trim_sections_to_budget(sections, token_budget)
+        
+        return '\n'.join(text for _, text in sections)
+    
+    def _trim_sections_to_budget(self, sections: List[Tuple[int, str]],
+                                 token_budget: int) -> List[Tuple[int, str]]:
+        """Отбрасывание наименее важных разделов контекста, пока он не уложится в бюджет токенов"""
+        tokens = [self.count_tokens(text) for _, text in sections]
+        total = sum(tokens)
+        if total <= token_budget:
+            return sections
+        
+        kept = set(range(len(sections)))
+        # Сначала низкий приоритет, среди равных - более поздние разделы
+        for idx in sorted(kept, key=lambda i: (sections[i][0], -i)):
+            if total <= token_budget or len(kept) == 1:
+                break
+            kept.remove(idx)
+            total -= tokens[idx]
+        
+        trimmed = [sections[i] for i in sorted(kept)]
+        if total > token_budget:
+            # Остался один слишком длинный раздел - обрезаем его пропорционально
+            priority, text = trimmed[0]
+            trimmed = [(priority, text[:len(text) * token_budget // total])]
+        
+        logger.info(f"✂️ Контекст сокращен до {len(trimmed)} из {len(sections)} разделов "
+                    f"(бюджет {token_budget} токенов)")
+        return trimmed
+    
+    def generate_smart_answer(self, user_question: str, user_context: Dict = None,
+                              on_partial: Callable[[str], None] = None) -> Dict:
+        """Генерация умного ответа через бесплатные GPT API с использованием RAG (on_partial - для потоковой выдачи)"""
         
         if not self.is_available():
             # Fallback к базовой системе Q&A
             return self.qa_processor.get_answer(user_question)
         
         try:
-            # Получаем контекст из базы знаний
-            relevant_context = self.get_relevant_context(user_question)
+            qa_result, related_qa = self.qa_processor.query(user_question, top_k=5)
             
-            # Формируем сообщения для GPT
-            messages = [
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": f"""
-КОНТЕКСТ из базы знаний ИТМО:
-{relevant_context}
-
-ВОПРОС ПОЛЬЗОВАТЕЛЯ: {user_question}
-
-Ответь на вопрос, используя информацию из контекста. Если точной информации нет, скажи об этом и предложи альтернативы.
-                """.strip()}
-            ]
+            # Если база знаний уверенно знает ответ, не тратим время на GPT
+            if ENABLE_QA_SHORTCUT and qa_result['confidence'] >= QA_SHORTCUT_THRESHOLD:
+                self.qa_shortcut_hits += 1
+                logger.info(f"⚡ Ответ из базы знаний без GPT: confidence={qa_result['confidence']:.3f}, "
+                            f"всего быстрых ответов: {self.qa_shortcut_hits}")
+                return {**qa_result, 'method': 'qa_shortcut'}
             
-            # Добавляем информацию о пользователе если есть
+            # Информация о пользователе если есть
+            user_info = None
             if user_context:
                 user_info = f"Информация о пользователе: {json.dumps(user_context, ensure_ascii=False)}"
-                messages[1]["content"] += f"\n\n{user_info}"
+            
+            # Похожий вопрос с тем же контекстом уже задавали - повторно используем ответ
+            cached_result = self.answer_cache.get(user_question, user_info or '')
+            if cached_result:
+                cached_result['method'] = 'semantic_cache_hit'
+                return cached_result
+            
+            # Получаем контекст из базы знаний в пределах бюджета токенов
+            relevant_context = self.get_relevant_context(
+                user_question, qa_result=qa_result, related_qa=related_qa,
+                token_budget=self.get_context_token_budget(user_question, user_info))
+            
+            # Формируем сообщения для GPT
+            messages = self._build_messages(relevant_context, user_question, user_info)
             
             # Пробуем бесплатные API
-            gpt_answer = self.try_free_apis(messages)
+            gpt_answer = self.try_free_apis(messages, on_partial)
             
             if gpt_answer:
-                return {
+                result = {
                     'answer': gpt_answer,
                     'confidence': 0.9,  # Высокая уверенность для GPT ответов
                     'method': 'free_gpt_rag',
                     'context_used': len(relevant_context) > 100,
                     'is_ai_generated': True
                 }
+                self.answer_cache.put(user_question, result, user_info or '')
+                return result
             else:
                 # Fallback к базовой системе
                 fallback_result = self.qa_processor.get_answer(user_question)
@@ -457,52 +601,10 @@ class FreeGPTIntegration:
             return {'error': 'Бесплатные GPT API недоступны'}
         
         try:
-            programs = self.db.get_all_programs()
-            programs_context = ""
-            
-            for program in programs:
-                programs_context += f"\n📚 {program['name']}\n"
-                programs_context += f"Описание: {program.get('description', '')}\n"
-                programs_context += f"Продолжительность: {program.get('duration', '')}\n"
-                
-                if program.get('career_prospects'):
-                    programs_context += f"Карьерные перспективы: {', '.join(program['career_prospects'])}\n"
-                
-                # Добавляем примеры курсов
-                courses = self.db.get_courses_by_program(program['id'])[:8]
-                if courses:
-                    programs_context += "Ключевые курсы:\n"
-                    for course in courses:
-                        programs_context += f"  - {course['name']}\n"
-                programs_context += "\n" + "="*50 + "\n"
+            programs_context = self._get_cached_block('comparison', self._build_comparison_block)
             
             messages = [
-                {"role": "system", "content": """
-Ты - консультант по образованию в ИТМО. Сравни программы магистратуры по ИИ.
-
-ЗАДАЧА:
-- Четко объясни различия между программами
-- Для кого подходит каждая программа
-- Ключевые преимущества каждой
-- Помоги сделать выбор
-
-ФОРМАТ:
-🎓 Сравнение программ ИТМО:
-
-📊 КЛЮЧЕВЫЕ РАЗЛИЧИЯ:
-[основные отличия]
-
-👨‍💼 "Искусственный интеллект" - для кого:
-[целевая аудитория и особенности]
-
-🚀 "AI-продукты" - для кого:
-[целевая аудитория и особенности]
-
-💡 Как выбрать:
-[критерии выбора]
-
-Отвечай на русском языке, используй эмодзи.
-                """.strip()},
+                SYSTEM_MESSAGE_COMPARE,
                 {"role": "user", "content": f"""
 Информация о программах ИТМО:
 {programs_context}
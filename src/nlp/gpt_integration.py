@@ -1,22 +1,113 @@
 import openai
 import os
+import re
+import time
 import logging
 from typing import Dict, List, Optional, Tuple
 import json
 
 from src.database.db_manager import DatabaseManager
 from src.nlp.qa_processor import QAProcessor
-from config import TELEGRAM_BOT_TOKEN
+from src.nlp.semantic_cache import SemanticCache
+from config import TELEGRAM_BOT_TOKEN, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE, CONTEXT_BLOCK_TTL
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Ключевые слова тем курсов: одно регулярное выражение вместо перебора списка
+COURSE_KEYWORDS = ['машинное обучение', 'глубокое обучение', 'python', 'данные',
+                   'алгоритм', 'статистика', 'изображение', 'nlp', 'computer vision']
+COURSE_KEYWORDS_RE = re.compile('|'.join(map(re.escape, COURSE_KEYWORDS)))
+
+# Быстрая маршрутизация: какие блоки контекста нужны вопросу
+PROGRAMS_INTENT_RE = re.compile(r'программ|магистрат|поступ')
+COURSES_INTENT_RE = re.compile(r'курс|дисциплин|предмет|изуч')
+
+# Системные промпты: неизменный префикс запроса позволяет провайдеру кэшировать его
+SYSTEM_PROMPT_QA = """
+Ты - специализированный помощник для абитуриентов магистерских программ ИТМО по искусственному интеллекту.
+
+ТВОЯ РОЛЬ:
+- Отвечаешь на вопросы о программах "Искусственный интеллект" и "AI-продукты" 
+- Помогаешь выбирать курсы и строить учебный план
+- Консультируешь по поступлению и карьерным перспективам
+- Используешь ТОЛЬКО информацию из предоставленного контекста
+
+ПРАВИЛА:
+- Отвечай дружелюбно и профессионально
+- Если информации нет в контексте, честно скажи об этом
+- Рекомендуй конкретные курсы на основе интересов пользователя
+- Используй эмодзи для лучшего восприятия
+- Отвечай на русском языке
+
+КОНТЕКСТ из базы знаний будет предоставлен отдельно.
+""".strip()
+
+SYSTEM_PROMPT_RECS = """
+Ты - эксперт по образовательным программам ИТМО в области ИИ. 
+Рекомендуй курсы на основе интересов и бэкграунда пользователя.
+
+ЗАДАЧА:
+- Проанализируй интересы и опыт пользователя
+- Выбери 5 наиболее подходящих курсов
+- Объясни почему каждый курс подходит
+- Дай советы по последовательности изучения
+
+ФОРМАТ ОТВЕТА:
+🎯 Персональные рекомендации:
+
+🔥 1. [Название курса]
+📚 Программа: [программа]
+💡 Почему подходит: [обоснование]
+
+[продолжи для всех 5 курсов]
+
+💭 Советы по обучению: [общие рекомендации]
+""".strip()
+SYSTEM_MESSAGE_RECS = {"role": "system", "content": SYSTEM_PROMPT_RECS}
+
+SYSTEM_PROMPT_COMPARE = """
+Ты - консультант по образованию в ИТМО. Сравни программы магистратуры по ИИ.
+
+ЗАДАЧА:
+- Четко объясни различия между программами
+- Для кого подходит каждая программа
+- Ключевые преимущества каждой
+- Помоги сделать выбор
+
+ФОРМАТ:
+🎓 Сравнение программ ИТМО:
+
+📊 КЛЮЧЕВЫЕ РАЗЛИЧИЯ:
+[основные отличия]
+
+👨‍💼 "Искусственный интеллект" - для кого:
+[целевая аудитория и особенности]
+
+🚀 "AI-продукты" - для кого:
+[целевая аудитория и особенности]
+
+💡 Как выбрать:
+[критерии выбора]
+""".strip()
+SYSTEM_MESSAGE_COMPARE = {"role": "system", "content": SYSTEM_PROMPT_COMPARE}
+
 class GPTIntegration:
     def __init__(self, db_manager: DatabaseManager = None):
         """Инициализация GPT интеграции с RAG"""
         self.db = db_manager or DatabaseManager()
         self.qa_processor = QAProcessor(self.db)
         
+        # Готовые блоки контекста о программах и курсах: {имя: (версия БД, время сборки, значение)}
+        self._context_blocks = {}
+        
+        # Кэш ответов GPT на семантически похожие вопросы
+        self.answer_cache = SemanticCache(
+            self.qa_processor.cache_features,
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            max_size=SEMANTIC_CACHE_SIZE
+        )
+        
         # Настройки API
         self.api_key = os.getenv('OPENAI_API_KEY') or os.getenv('GPT_API_KEY')
         self.api_base = os.getenv('GPT_API_BASE', 'https://api.openai.com/v1')
@@ -32,77 +123,118 @@ class GPTIntegration:
         else:
             logger.warning("GPT API ключ не найден. Используется только база знаний.")
         
-        # Системный промпт для ИТМО бота
-        self.system_prompt = """
-Ты - специализированный помощник для абитуриентов магистерских программ ИТМО по искусственному интеллекту.
-
-ТВОЯ РОЛЬ:
-- Отвечаешь на вопросы о программах "Искусственный интеллект" и "AI-продукты" 
-- Помогаешь выбирать курсы и строить учебный план
-- Консультируешь по поступлению и карьерным перспективам
-- Используешь ТОЛЬКО информацию из предоставленного контекста
-
-ПРАВИЛА:
-- Отвечай дружелюбно и профессионально
-- Если информации нет в контексте, честно скажи об этом
-- Рекомендуй конкретные курсы на основе интересов пользователя
-- Используй эмодзи для лучшего восприятия
-- Отвечай на русском языке
-
-КОНТЕКСТ из базы знаний будет предоставлен отдельно.
-        """.strip()
+        # Системный промпт для ИТМО бота: одно и то же сообщение в каждом запросе
+        self.system_prompt = SYSTEM_PROMPT_QA
+        self._system_message = {"role": "system", "content": SYSTEM_PROMPT_QA}
     
     def is_available(self) -> bool:
         """Проверка доступности GPT API"""
         return self.api_key is not None
     
+    def _get_cached_block(self, name: str, builder):
+        """Готовый блок контекста: пересобирается после записи в БД или по истечении TTL"""
+        now = time.monotonic()
+        cached = self._context_blocks.get(name)
+        if (cached and cached[0] == self.db.data_version and
+                now - cached[1] < CONTEXT_BLOCK_TTL):
+            return cached[2]
+        
+        value = builder()
+        self._context_blocks[name] = (self.db.data_version, now, value)
+        return value
+    
+    def _build_programs_block(self) -> str:
+        """Блок с информацией о программах и примерами курсов"""
+        programs = self.db.get_programs_with_sample_courses(limit_per_program=5)
+        block_parts = ["\nИНФОРМАЦИЯ О ПРОГРАММАХ:"]
+        for program in programs:
+            block_parts.append(f"\n📚 {program['name']}")
+            block_parts.append(f"Описание: {program.get('description', '')[:200]}...")
+            block_parts.append(f"Продолжительность: {program.get('duration', '')}")
+            
+            # Добавляем несколько курсов программы
+            courses = program['courses']
+            if courses:
+                block_parts.append("Примеры курсов:")
+                for course in courses:
+                    tags_str = ', '.join(course.get('tags', [])[:3])
+                    block_parts.append(f"  - {course['name']} ({tags_str})")
+        
+        return '\n'.join(block_parts)
+    
+    def _build_courses_block(self) -> str:
+        """Блок со всеми курсами для рекомендаций"""
+        block_parts = ["ДОСТУПНЫЕ КУРСЫ ИТМО:\n\n"]
+        for course in self.db.get_all_courses():
+            block_parts.append(f"📚 {course['name']}\n")
+            block_parts.append(f"   Программа: {course.get('program_name', 'Неизвестно')}\n")
+            block_parts.append(f"   Семестр: {course.get('semester', '')}\n")
+            block_parts.append(f"   Кредиты: {course.get('credits', '')}\n")
+            if course.get('tags'):
+                block_parts.append(f"   Теги: {', '.join(course['tags'])}\n")
+            block_parts.append("\n")
+        
+        return ''.join(block_parts)
+    
+    def _build_comparison_block(self) -> str:
+        """Блок с описанием программ для их сравнения"""
+        programs = self.db.get_programs_with_sample_courses(limit_per_program=8)
+        block_parts = []
+        
+        for program in programs:
+            block_parts.append(f"\n📚 {program['name']}\n")
+            block_parts.append(f"Описание: {program.get('description', '')}\n")
+            block_parts.append(f"Продолжительность: {program.get('duration', '')}\n")
+            
+            if program.get('career_prospects'):
+                block_parts.append(f"Карьерные перспективы: {', '.join(program['career_prospects'])}\n")
+            
+            # Добавляем примеры курсов
+            if program['courses']:
+                block_parts.append("Ключевые курсы:\n")
+                for course in program['courses']:
+                    block_parts.append(f"  - {course['name']}\n")
+            block_parts.append("\n" + "="*50 + "\n")
+        
+        return ''.join(block_parts)
+    
     def get_relevant_context(self, user_question: str, max_items: int = 5) -> str:
         """Получение релевантного контекста из базы знаний"""
         context_parts = []
         
-        # 1. Ищем похожие Q&A
-        qa_result = self.qa_processor.get_answer(user_question)
+        # 1. Ищем похожие Q&A и связанные вопросы за один проход
+        qa_result, related_qa = self.qa_processor.query(user_question, top_k=3)
         if qa_result['confidence'] > 0.3:
             context_parts.append(f"Q: {qa_result.get('matched_question', 'Похожий вопрос')}")
             context_parts.append(f"A: {qa_result['answer']}")
         
-        # 2. Получаем связанные вопросы
-        related_qa = self.qa_processor.get_related_questions(user_question, top_k=3)
+        # 2. Добавляем связанные вопросы
         for qa in related_qa:
             context_parts.append(f"Q: {qa['question']}")
             context_parts.append(f"A: {qa['answer']}")
         
-        # 3. Добавляем информацию о программах
-        programs = self.db.get_all_programs()
-        context_parts.append("\nИНФОРМАЦИЯ О ПРОГРАММАХ:")
-        for program in programs:
-            context_parts.append(f"\n📚 {program['name']}")
-            context_parts.append(f"Описание: {program.get('description', '')[:200]}...")
-            context_parts.append(f"Продолжительность: {program.get('duration', '')}")
-            
-            # Добавляем несколько курсов программы
-            courses = self.db.get_courses_by_program(program['id'])[:5]
-            if courses:
-                context_parts.append("Примеры курсов:")
-                for course in courses:
-                    tags_str = ', '.join(course.get('tags', [])[:3])
-                    context_parts.append(f"  - {course['name']} ({tags_str})")
+        # Блоки о программах и курсах нужны, только если о них спрашивают
+        # или база знаний не нашла подходящего ответа
+        question_lower = user_question.lower()
+        needs_courses = COURSES_INTENT_RE.search(question_lower) is not None
+        needs_programs = (needs_courses or qa_result['confidence'] <= 0.3 or
+                          PROGRAMS_INTENT_RE.search(question_lower) is not None)
+        
+        # 3. Добавляем информацию о программах (блок зависит только от содержимого БД)
+        if needs_programs:
+            context_parts.append(self._get_cached_block('programs', self._build_programs_block))
         
         # 4. Если вопрос о конкретных курсах, добавляем релевантные курсы
-        if any(word in user_question.lower() for word in ['курс', 'дисциплина', 'предмет', 'изучение']):
-            all_courses = self.db.get_all_courses()
-            
-            # Поиск по ключевым словам
-            course_keywords = ['машинное обучение', 'глубокое обучение', 'python', 'данные', 
-                             'алгоритм', 'статистика', 'изображение', 'nlp', 'computer vision']
+        if needs_courses:
+            # Поиск по ключевым словам: темы вопроса сопоставляются с темами курса
+            question_keywords = set(COURSE_KEYWORDS_RE.findall(question_lower))
             
             relevant_courses = []
-            for course in all_courses:
-                course_text = f"{course['name']} {' '.join(course.get('tags', []))}".lower()
-                for keyword in course_keywords:
-                    if keyword in user_question.lower() and keyword in course_text:
+            if question_keywords:
+                for course in self.db.get_all_courses():
+                    course_text = f"{course['name']} {' '.join(course.get('tags', []))}".lower()
+                    if question_keywords.intersection(COURSE_KEYWORDS_RE.findall(course_text)):
                         relevant_courses.append(course)
-                        break
             
             if relevant_courses:
                 context_parts.append("\nСВЯЗАННЫЕ КУРСЫ:")
@@ -121,12 +253,23 @@ class GPTIntegration:
             return self.qa_processor.get_answer(user_question)
         
         try:
+            # Информация о пользователе если есть
+            user_info = None
+            if user_context:
+                user_info = f"Информация о пользователе: {json.dumps(user_context, ensure_ascii=False)}"
+            
+            # Похожий вопрос с тем же контекстом уже задавали - повторно используем ответ
+            cached_result = self.answer_cache.get(user_question, user_info or '')
+            if cached_result:
+                cached_result['method'] = 'semantic_cache_hit'
+                return cached_result
+            
             # Получаем контекст из базы знаний
             relevant_context = self.get_relevant_context(user_question)
             
             # Формируем сообщения для GPT
             messages = [
-                {"role": "system", "content": self.system_prompt},
+                self._system_message,
                 {"role": "user", "content": f"""
 КОНТЕКСТ из базы знаний ИТМО:
 {relevant_context}
@@ -138,8 +281,7 @@ class GPTIntegration:
             ]
             
             # Добавляем информацию о пользователе если есть
-            if user_context:
-                user_info = f"Информация о пользователе: {json.dumps(user_context, ensure_ascii=False)}"
+            if user_info:
                 messages[1]["content"] += f"\n\n{user_info}"
             
             # Запрос к GPT
@@ -153,13 +295,15 @@ class GPTIntegration:
             
             gpt_answer = response.choices[0].message.content.strip()
             
-            return {
+            result = {
                 'answer': gpt_answer,
                 'confidence': 0.9,  # Высокая уверенность для GPT ответов
                 'method': 'gpt_rag',
                 'context_used': len(relevant_context) > 100,
                 'is_ai_generated': True
             }
+            self.answer_cache.put(user_question, result, user_info or '')
+            return result
             
         except Exception as e:
             logger.error(f"Ошибка GPT API: {e}")
@@ -176,42 +320,11 @@ class GPTIntegration:
             return {'error': 'GPT API недоступен'}
         
         try:
-            # Получаем все курсы из базы
-            all_courses = self.db.get_all_courses()
-            
             # Формируем контекст с курсами
-            courses_context = "ДОСТУПНЫЕ КУРСЫ ИТМО:\n\n"
-            for course in all_courses:
-                courses_context += f"📚 {course['name']}\n"
-                courses_context += f"   Программа: {course.get('program_name', 'Неизвестно')}\n"
-                courses_context += f"   Семестр: {course.get('semester', '')}\n"
-                courses_context += f"   Кредиты: {course.get('credits', '')}\n"
-                if course.get('tags'):
-                    courses_context += f"   Теги: {', '.join(course['tags'])}\n"
-                courses_context += "\n"
+            courses_context = self._get_cached_block('courses', self._build_courses_block)
             
             messages = [
-                {"role": "system", "content": """
-Ты - эксперт по образовательным программам ИТМО в области ИИ. 
-Рекомендуй курсы на основе интересов и бэкграунда пользователя.
-
-ЗАДАЧА:
-- Проанализируй интересы и опыт пользователя
-- Выбери 5 наиболее подходящих курсов
-- Объясни почему каждый курс подходит
-- Дай советы по последовательности изучения
-
-ФОРМАТ ОТВЕТА:
-🎯 Персональные рекомендации:
-
-🔥 1. [Название курса]
-📚 Программа: [программа]
-💡 Почему подходит: [обоснование]
-
-[продолжи для всех 5 курсов]
-
-💭 Советы по обучению: [общие рекомендации]
-                """.strip()},
+                SYSTEM_MESSAGE_RECS,
                 {"role": "user", "content": f"""
 {courses_context}
 
@@ -249,50 +362,10 @@ class GPTIntegration:
             return {'error': 'GPT API недоступен'}
         
         try:
-            programs = self.db.get_all_programs()
-            programs_context = ""
-            
-            for program in programs:
-                programs_context += f"\n📚 {program['name']}\n"
-                programs_context += f"Описание: {program.get('description', '')}\n"
-                programs_context += f"Продолжительность: {program.get('duration', '')}\n"
-                
-                if program.get('career_prospects'):
-                    programs_context += f"Карьерные перспективы: {', '.join(program['career_prospects'])}\n"
-                
-                # Добавляем примеры курсов
-                courses = self.db.get_courses_by_program(program['id'])[:8]
-                if courses:
-                    programs_context += "Ключевые курсы:\n"
-                    for course in courses:
-                        programs_context += f"  - {course['name']}\n"
-                programs_context += "\n" + "="*50 + "\n"
+            programs_context = self._get_cached_block('comparison', self._build_comparison_block)
             
             messages = [
-                {"role": "system", "content": """
-Ты - консультант по образованию в ИТМО. Сравни программы магистратуры по ИИ.
-
-ЗАДАЧА:
-- Четко объясни различия между программами
-- Для кого подходит каждая программа
-- Ключевые преимущества каждой
-- Помоги сделать выбор
-
-ФОРМАТ:
-🎓 Сравнение программ ИТМО:
-
-📊 КЛЮЧЕВЫЕ РАЗЛИЧИЯ:
-[основные отличия]
-
-👨‍💼 "Искусственный интеллект" - для кого:
-[целевая аудитория и особенности]
-
-🚀 "AI-продукты" - для кого:
-[целевая аудитория и особенности]
-
-💡 Как выбрать:
-[критерии выбора]
-                """.strip()},
+                SYSTEM_MESSAGE_COMPARE,
                 {"role": "user", "content": f"""
 Информация о программах ИТМО:
 {programs_context}
@@ -1,147 +1,290 @@
 import re
+import os
+import hashlib
 import logging
-from typing import List, Dict, Tuple, Optional
+import functools
+import threading
+from typing import List, Dict, FrozenSet, Tuple, Optional
 import numpy as np
+import joblib
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.exceptions import NotFittedError
 import nltk
 from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 from nltk.stem import SnowballStemmer
 
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
 from src.database.db_manager import DatabaseManager
-from config import SIMILARITY_THRESHOLD, MIN_RELEVANCE_SCORE
+from config import SIMILARITY_THRESHOLD, MIN_RELEVANCE_SCORE, TFIDF_CACHE_PATH, ANN_INDEX_MIN_SIZE
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Токены: слова и числа длиной от 3 символов (текст предварительно приводится к нижнему регистру)
+TOKEN_PATTERN = re.compile(r'[a-zа-яё0-9]{3,}')
+
 class QAProcessor:
-    def __init__(self, db_manager: DatabaseManager = None):
+    def __init__(self, db_manager: DatabaseManager = None, cache_path: str = TFIDF_CACHE_PATH):
         """Инициализация процессора вопросов и ответов"""
         self.db = db_manager or DatabaseManager()
+        self.cache_path = cache_path
         self.vectorizer = TfidfVectorizer(
             max_features=1000,
             ngram_range=(1, 2),
+            norm='l2',  # Нормированные векторы: косинусное сходство = скалярное произведение
             stop_words=None  # Будем обрабатывать русские стоп-слова сами
         )
         
         # Инициализация NLTK компонентов
         self._init_nltk()
         
+        # Кэши предобработки: вопросы пользователей и слова часто повторяются
+        self._preprocess_cached = functools.lru_cache(maxsize=4096)(self._preprocess_text_uncached)
+        self._stem = functools.lru_cache(maxsize=50000)(self.stemmer.stem) if self.stemmer else None
+        
+        # Сообщения пользователей обрабатываются параллельно: поиск не должен видеть индекс в середине обновления
+        self._lock = threading.RLock()
+        # Версия векторизатора: увеличивается при каждой загрузке или переобучении
+        self.vectorizer_version = 0
+        
         # Загружаем данные
-        self.qa_pairs = self.db.get_all_qa_pairs()
-        self.questions = [qa['question'] for qa in self.qa_pairs]
-        self.answers = [qa['answer'] for qa in self.qa_pairs]
+        self._set_qa_pairs(self.db.get_all_qa_pairs())
         
         # Предобрабатываем вопросы и создаем векторы
-        self.processed_questions = [self._preprocess_text(q) for q in self.questions]
+        self.processed_questions = self._preprocess_batch(self.questions)
         
         if self.processed_questions:
-            self.question_vectors = self._fit_vectorizer()
+            self.question_vectors = self._load_or_fit_vectorizer()
         else:
             self.question_vectors = None
             logger.warning("Нет данных для обучения векторизатора")
+        self._update_similarity_index()
+    
+    def _set_qa_pairs(self, qa_pairs: List[Dict]):
+        """Сохранение пар Q&A: поля хранятся отдельными массивами для быстрой выборки по индексам"""
+        self.qa_pairs = qa_pairs
+        self.questions = np.array([qa['question'] for qa in qa_pairs], dtype=object)
+        self.answers = np.array([qa['answer'] for qa in qa_pairs], dtype=object)
+        self.categories = np.array([qa.get('category', 'general') for qa in qa_pairs], dtype=object)
     
     def _init_nltk(self):
         """Инициализация NLTK данных"""
         try:
             # Скачиваем необходимые данные NLTK
-            nltk.download('punkt', quiet=True)
             nltk.download('stopwords', quiet=True)
             
             # Инициализируем стеммер и стоп-слова
             self.stemmer = SnowballStemmer('russian')
-            self.stop_words = set(stopwords.words('russian'))
             
             # Добавляем дополнительные стоп-слова
             additional_stops = {
                 'это', 'быть', 'мочь', 'весь', 'свой', 'который', 'такой',
                 'только', 'один', 'время', 'год', 'человек', 'сказать'
             }
-            self.stop_words.update(additional_stops)
+            # Слова короче 3 символов отсекает сам токенизатор, хранить их не нужно
+            self.stop_words = frozenset(
+                word for word in stopwords.words('russian') if len(word) > 2
+            ) | additional_stops
             
         except Exception as e:
             logger.error(f"Ошибка инициализации NLTK: {e}")
             # Fallback к базовому набору
             self.stemmer = None
-            self.stop_words = set()
+            self.stop_words = frozenset()
     
     def _preprocess_text(self, text: str) -> str:
+        """Предобработка текста (с кэшированием результатов)"""
+        return self._preprocess_cached(text)
+    
+    def _preprocess_text_uncached(self, text: str) -> str:
         """Предобработка текста"""
         if not text:
             return ""
         
-        # Приводим к нижнему регистру
-        text = text.lower()
+        # Токенизация одним регулярным выражением
+        return self._normalize_tokens(TOKEN_PATTERN.findall(text.lower()))
+    
+    def _normalize_tokens(self, tokens: List[str]) -> str:
+        """Удаление стоп-слов и стемминг токенов"""
+        stop_words = self.stop_words
+        kept_tokens = [token for token in tokens if token not in stop_words]
         
-        # Удаляем лишние символы
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
+        if not self._stem:
+            return ' '.join(kept_tokens)
         
-        # Токенизация
         try:
-            tokens = word_tokenize(text, language='russian')
-        except:
-            tokens = text.split()
-        
-        # Удаляем стоп-слова и стеммируем
-        processed_tokens = []
-        for token in tokens:
-            if token not in self.stop_words and len(token) > 2:
-                if self.stemmer:
-                    try:
-                        stemmed = self.stemmer.stem(token)
-                        processed_tokens.append(stemmed)
-                    except:
-                        processed_tokens.append(token)
-                else:
-                    processed_tokens.append(token)
-        
-        return ' '.join(processed_tokens)
+            return ' '.join([self._stem(token) for token in kept_tokens])
+        except Exception:
+            # Стеммим по одному, оставляя проблемные токены без изменений
+            return ' '.join(self._safe_stem(token) for token in kept_tokens)
+    
+    def _safe_stem(self, token: str) -> str:
+        """Стемминг одного токена без исключений"""
+        try:
+            return self._stem(token)
+        except Exception:
+            return token
     
-    def _fit_vectorizer(self) -> np.ndarray:
+    def _preprocess_batch(self, texts: List[str]) -> List[str]:
+        """Пакетная предобработка текстов (общий кэш стемминга для всех вопросов)"""
+        token_lists = map(TOKEN_PATTERN.findall, (text.lower() if text else "" for text in texts))
+        return [self._normalize_tokens(tokens) for tokens in token_lists]
+    
+    def _fit_vectorizer(self) -> Optional[sparse.csr_matrix]:
         """Обучение векторизатора на имеющихся вопросах"""
         try:
-            vectors = self.vectorizer.fit_transform(self.processed_questions)
-            return vectors.toarray()
+            return self.vectorizer.fit_transform(self.processed_questions)
         except Exception as e:
             logger.error(f"Ошибка при создании векторов: {e}")
             return None
     
-    def find_similar_question(self, user_question: str) -> Tuple[Optional[Dict], float]:
-        """Поиск наиболее похожего вопроса"""
-        if not self.question_vectors is not None:
+    def _corpus_hash(self) -> str:
+        """Хэш предобработанных вопросов для проверки актуальности кэша"""
+        return hashlib.sha1('\x1f'.join(self.processed_questions).encode('utf-8')).hexdigest()
+    
+    def _load_or_fit_vectorizer(self):
+        """Загрузка векторизатора из кэша или обучение заново"""
+        # Векторы, построенные прежним векторизатором, с новыми несопоставимы
+        self.vectorizer_version += 1
+        corpus_hash = self._corpus_hash()
+        
+        if self.cache_path and os.path.exists(self.cache_path):
+            try:
+                vectorizer, vectors, cached_hash = joblib.load(self.cache_path)
+                if cached_hash == corpus_hash and sparse.issparse(vectors):
+                    self.vectorizer = vectorizer
+                    logger.info(f"TF-IDF векторизатор загружен из кэша {self.cache_path}")
+                    return vectors
+            except Exception as e:
+                logger.warning(f"Не удалось загрузить кэш векторизатора: {e}")
+        
+        vectors = self._fit_vectorizer()
+        
+        if vectors is not None and self.cache_path:
+            try:
+                joblib.dump((self.vectorizer, vectors, corpus_hash), self.cache_path, compress=3)
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить кэш векторизатора: {e}")
+        
+        return vectors
+    
+    def _update_similarity_index(self):
+        """Подготовка транспонированной матрицы для быстрого вычисления сходства"""
+        if self.question_vectors is not None:
+            self.question_vectors_T = self.question_vectors.T.tocsr()
+        else:
+            self.question_vectors_T = None
+        self._build_ann_index()
+    
+    def _build_ann_index(self):
+        """Построение HNSW индекса для больших баз вопросов"""
+        self.ann_index = None
+        if faiss is None or self.question_vectors is None or self.question_vectors.shape[0] <= ANN_INDEX_MIN_SIZE:
+            return
+        
+        try:
+            # Векторы уже нормированы по L2: скалярное произведение = косинусное сходство
+            dense_vectors = self.question_vectors.toarray().astype(np.float32)
+            index = faiss.IndexHNSWFlat(dense_vectors.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 200
+            index.add(dense_vectors)
+            index.hnsw.efSearch = 64
+            self.ann_index = index
+            logger.info(f"Построен HNSW индекс для {dense_vectors.shape[0]} вопросов")
+        except Exception as e:
+            logger.warning(f"Не удалось построить HNSW индекс, используется полный перебор: {e}")
+    
+    def _compute_similarities(self, user_vector: sparse.csr_matrix) -> np.ndarray:
+        """Косинусное сходство вопроса со всеми вопросами базы"""
+        # Строки TF-IDF нормированы по L2, поэтому достаточно одного разреженного произведения
+        return (user_vector @ self.question_vectors_T).toarray().ravel()
+    
+    def _top_matches(self, processed_question: str, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Индексы и сходство top_k наиболее похожих вопросов (по убыванию сходства)"""
+        k = min(top_k, len(self.questions))
+        if k <= 0:
+            return np.empty(0, dtype=int), np.empty(0)
+        
+        try:
+            user_vector = self.vectorizer.transform([processed_question])
+        except NotFittedError as e:
+            logger.error(f"Векторизатор не обучен: {e}")
+            return np.empty(0, dtype=int), np.empty(0)
+        
+        if self.ann_index is not None:
+            scores, indices = self.ann_index.search(user_vector.toarray().astype(np.float32), k)
+            found = indices[0] >= 0
+            return indices[0][found], scores[0][found]
+        
+        similarities = self._compute_similarities(user_vector)
+        
+        # Получаем индексы top_k наиболее похожих вопросов без полной сортировки
+        top_indices = np.argpartition(-similarities, k - 1)[:k]
+        top_indices = top_indices[np.argsort(-similarities[top_indices])]
+        return top_indices, similarities[top_indices]
+    
+    def vectorize(self, text: str) -> Optional[sparse.csr_matrix]:
+        """L2-нормированный TF-IDF вектор текста (None, если векторизатор не обучен)"""
+        processed_text = self._preprocess_text(text)
+        with self._lock:
+            if self.question_vectors is None:
+                return None
+            return self.vectorizer.transform([processed_text])
+    
+    def cache_features(self, text: str) -> Optional[Tuple[sparse.csr_matrix, FrozenSet[str], int]]:
+        """Признаки вопроса для семантического кэша: вектор, слова вне словаря и версия векторизатора"""
+        processed_text = self._preprocess_text(text)
+        with self._lock:
+            if self.question_vectors is None:
+                return None
+            # Слова вне словаря TF-IDF не попадают в вектор, поэтому сравниваются отдельно
+            vocabulary = self.vectorizer.vocabulary_
+            oov_tokens = frozenset(token for token in processed_text.split() if token not in vocabulary)
+            return self.vectorizer.transform([processed_text]), oov_tokens, self.vectorizer_version
+    
+    def _best_match(self, indices: np.ndarray, scores: np.ndarray) -> Tuple[Optional[Dict], float]:
+        """Выбор наиболее похожего вопроса"""
+        if len(indices) == 0:
             return None, 0.0
         
+        best_match_idx = indices[0]
+        best_similarity = scores[0]
+        
+        if best_similarity >= MIN_RELEVANCE_SCORE:
+            return self.qa_pairs[best_match_idx], best_similarity
+        else:
+            return None, best_similarity
+    
+    def _related_from_matches(self, indices: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        """Связанные вопросы из найденных совпадений"""
+        relevant = scores >= MIN_RELEVANCE_SCORE
+        indices, scores = indices[relevant], scores[relevant]
+        
+        return [
+            {'question': question, 'answer': answer, 'similarity': similarity, 'category': category}
+            for question, answer, category, similarity in zip(
+                self.questions[indices], self.answers[indices], self.categories[indices], scores)
+        ]
+    
+    def find_similar_question(self, user_question: str) -> Tuple[Optional[Dict], float]:
+        """Поиск наиболее похожего вопроса"""
         # Предобрабатываем пользовательский вопрос
         processed_question = self._preprocess_text(user_question)
         
-        try:
-            # Векторизуем вопрос пользователя
-            user_vector = self.vectorizer.transform([processed_question]).toarray()
-            
-            # Вычисляем косинусное сходство
-            similarities = cosine_similarity(user_vector, self.question_vectors)[0]
+        with self._lock:
+            if self.question_vectors is None:
+                return None, 0.0
             
             # Находим наиболее похожий вопрос
-            best_match_idx = np.argmax(similarities)
-            best_similarity = similarities[best_match_idx]
-            
-            if best_similarity >= MIN_RELEVANCE_SCORE:
-                return self.qa_pairs[best_match_idx], best_similarity
-            else:
-                return None, best_similarity
-                
-        except Exception as e:
-            logger.error(f"Ошибка при поиске похожего вопроса: {e}")
-            return None, 0.0
+            return self._best_match(*self._top_matches(processed_question, 1))
     
-    def get_answer(self, user_question: str) -> Dict:
-        """Получение ответа на вопрос пользователя"""
-        # Ищем наиболее похожий вопрос
-        similar_qa, similarity = self.find_similar_question(user_question)
-        
+    def _build_answer(self, similar_qa: Optional[Dict], similarity: float) -> Dict:
+        """Формирование ответа по найденному похожему вопросу"""
         if similar_qa and similarity >= SIMILARITY_THRESHOLD:
             return {
                 'answer': similar_qa['answer'],
@@ -167,35 +310,34 @@ class QAProcessor:
                 'is_exact_match': False
             }
     
+    def get_answer(self, user_question: str) -> Dict:
+        """Получение ответа на вопрос пользователя"""
+        # Ищем наиболее похожий вопрос
+        similar_qa, similarity = self.find_similar_question(user_question)
+        return self._build_answer(similar_qa, similarity)
+    
     def get_related_questions(self, user_question: str, top_k: int = 3) -> List[Dict]:
         """Получение связанных вопросов"""
-        if not self.question_vectors is not None:
-            return []
-        
         processed_question = self._preprocess_text(user_question)
         
-        try:
-            user_vector = self.vectorizer.transform([processed_question]).toarray()
-            similarities = cosine_similarity(user_vector, self.question_vectors)[0]
-            
-            # Получаем индексы top_k наиболее похожих вопросов
-            top_indices = np.argsort(similarities)[::-1][:top_k]
-            
-            related = []
-            for idx in top_indices:
-                if similarities[idx] >= MIN_RELEVANCE_SCORE:
-                    related.append({
-                        'question': self.qa_pairs[idx]['question'],
-                        'answer': self.qa_pairs[idx]['answer'],
-                        'similarity': similarities[idx],
-                        'category': self.qa_pairs[idx].get('category', 'general')
-                    })
+        with self._lock:
+            if self.question_vectors is None:
+                return []
             
-            return related
+            return self._related_from_matches(*self._top_matches(processed_question, top_k))
+    
+    def query(self, user_question: str, top_k: int = 3) -> Tuple[Dict, List[Dict]]:
+        """Ответ и связанные вопросы за один проход векторизации"""
+        processed_question = self._preprocess_text(user_question)
+        
+        with self._lock:
+            if self.question_vectors is None:
+                return self._build_answer(None, 0.0), []
             
-        except Exception as e:
-            logger.error(f"Ошибка при поиске связанных вопросов: {e}")
-            return []
+            indices, scores = self._top_matches(processed_question, max(top_k, 1))
+            similar_qa, similarity = self._best_match(indices, scores)
+            related = self._related_from_matches(indices[:top_k], scores[:top_k])
+        return self._build_answer(similar_qa, similarity), related
     
     def add_qa_pair(self, question: str, answer: str, category: str = 'general') -> bool:
         """Добавление новой пары вопрос-ответ"""
@@ -207,7 +349,16 @@ class QAProcessor:
             self.db.insert_qa_pair(question, answer, category, keywords=keywords)
             
             # Обновляем внутренние данные
-            self._reload_data()
+            with self._lock:
+                if self.question_vectors is None:
+                    self._reload_data()
+                else:
+                    self._append_qa_pair({
+                        'question': question,
+                        'answer': answer,
+                        'category': category,
+                        'keywords': keywords
+                    })
             
             logger.info(f"Добавлена новая пара Q&A: {question[:50]}...")
             return True
@@ -225,29 +376,46 @@ class QAProcessor:
         keywords = list(set([word for word in words if len(word) > 3]))
         return keywords[:10]  # Ограничиваем количество ключевых слов
     
+    def _append_qa_pair(self, qa: Dict):
+        """Добавление пары в индекс без переобучения векторизатора"""
+        processed_question = self._preprocess_text(qa['question'])
+        new_vector = self.vectorizer.transform([processed_question])
+        
+        self.qa_pairs.append(qa)
+        self.questions = np.append(self.questions, np.array([qa['question']], dtype=object))
+        self.answers = np.append(self.answers, np.array([qa['answer']], dtype=object))
+        self.categories = np.append(self.categories, np.array([qa.get('category', 'general')], dtype=object))
+        self.processed_questions.append(processed_question)
+        self.question_vectors = sparse.vstack([self.question_vectors, new_vector], format='csr')
+        self.question_vectors_T = self.question_vectors.T.tocsr()
+        if self.ann_index is not None:
+            self.ann_index.add(new_vector.toarray().astype(np.float32))
+        else:
+            self._build_ann_index()
+        # Кэш на диске станет неактуальным и будет пересобран при следующем запуске
+    
     def _reload_data(self):
         """Перезагрузка данных из базы"""
-        self.qa_pairs = self.db.get_all_qa_pairs()
-        self.questions = [qa['question'] for qa in self.qa_pairs]
-        self.answers = [qa['answer'] for qa in self.qa_pairs]
+        self._set_qa_pairs(self.db.get_all_qa_pairs())
         
-        self.processed_questions = [self._preprocess_text(q) for q in self.questions]
+        self.processed_questions = self._preprocess_batch(self.questions)
         
         if self.processed_questions:
-            self.question_vectors = self._fit_vectorizer()
+            self.question_vectors = self._load_or_fit_vectorizer()
+            self._update_similarity_index()
     
     def get_statistics(self) -> Dict:
         """Получение статистики по Q&A базе"""
         categories = {}
-        for qa in self.qa_pairs:
-            category = qa.get('category', 'unknown')
+        for category in self.categories:
+            category = category or 'unknown'
             categories[category] = categories.get(category, 0) + 1
         
         return {
-            'total_qa_pairs': len(self.qa_pairs),
+            'total_qa_pairs': len(self.questions),
             'categories': categories,
-            'avg_question_length': np.mean([len(q) for q in self.questions]) if self.questions else 0,
-            'avg_answer_length': np.mean([len(a) for a in self.answers]) if self.answers else 0
+            'avg_question_length': np.mean([len(q) for q in self.questions]) if self.questions.size else 0,
+            'avg_answer_length': np.mean([len(a) for a in self.answers]) if self.answers.size else 0
         }
 
 # Пример использования
@@ -0,0 +1,142 @@
+import logging
+import threading
+from typing import Callable, Dict, FrozenSet, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class SemanticCache:
+    """Семантический кэш ответов: похожий вопрос получает уже сгенерированный ответ"""
+
+    def __init__(self, featurize: Callable[[str], Optional[Tuple[sparse.csr_matrix, FrozenSet[str], int]]],
+                 threshold: float = 0.85, max_size: int = 1000):
+        """
+        featurize - функция, возвращающая L2-нормированный вектор вопроса, его слова вне словаря
+                    векторизатора и версию векторизатора
+        threshold - минимальное косинусное сходство для попадания в кэш
+        max_size - максимальное число ответов в кэше (вытесняются давно неиспользуемые)
+        """
+        self.featurize = featurize
+        self.threshold = threshold
+        self.max_size = max_size
+
+        self._vectors = []
+        self._answers = []
+        self._context_keys = []
+        self._oov_tokens = []
+        self._last_used = []
+        self._matrix = None
+        self._vectorizer_version = None
+        self._clock = 0
+        # Кэш используется из рабочих потоков бота
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    def clear(self):
+        """Очистка кэша"""
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._vectors = []
+        self._answers = []
+        self._context_keys = []
+        self._oov_tokens = []
+        self._last_used = []
+        self._matrix = None
+
+    def _get_matrix(self) -> sparse.csr_matrix:
+        """Матрица векторов закэшированных вопросов (пересобирается только после изменений)"""
+        if self._matrix is None:
+            self._matrix = sparse.vstack(self._vectors, format='csr')
+        return self._matrix
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get(self, question: str, context_key: str = '') -> Optional[Dict]:
+        """Поиск ответа на семантически похожий вопрос с тем же контекстом пользователя"""
+        with self._lock:
+            return self._get(question, context_key)
+
+    def _get(self, question: str, context_key: str) -> Optional[Dict]:
+        if not self._answers:
+            self.misses += 1
+            return None
+
+        features = self.featurize(question)
+        if features is None:
+            self.misses += 1
+            return None
+        vector, oov_tokens, version = features
+        if vector.nnz == 0:
+            self.misses += 1
+            return None
+
+        if version != self._vectorizer_version:
+            # Векторизатор переобучен - старые векторы несопоставимы
+            self._clear()
+            self.misses += 1
+            return None
+
+        similarities = (self._get_matrix() @ vector.T).toarray().ravel()
+
+        # Ответы для другого контекста пользователя не подходят, как и вопросы, отличающиеся
+        # словами вне словаря (в векторе они не видны: "курс по X" и "курс по Y" совпали бы)
+        for idx, (key, entry_oov) in enumerate(zip(self._context_keys, self._oov_tokens)):
+            if key != context_key or entry_oov != oov_tokens:
+                similarities[idx] = -1.0
+
+        best_idx = int(np.argmax(similarities))
+        if similarities[best_idx] < self.threshold:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._last_used[best_idx] = self._tick()
+        logger.info(f"Семантический кэш: similarity={similarities[best_idx]:.3f}, "
+                    f"попаданий {self.hits}, промахов {self.misses}")
+        return dict(self._answers[best_idx])
+
+    def put(self, question: str, answer: Dict, context_key: str = ''):
+        """Сохранение ответа в кэш"""
+        with self._lock:
+            self._put(question, answer, context_key)
+
+    def _put(self, question: str, answer: Dict, context_key: str):
+        features = self.featurize(question)
+        if features is None:
+            return
+        vector, oov_tokens, version = features
+        if vector.nnz == 0:
+            return
+
+        if version != self._vectorizer_version:
+            self._clear()
+            self._vectorizer_version = version
+
+        if len(self._answers) >= self.max_size:
+            self._evict()
+
+        self._vectors.append(vector)
+        self._answers.append(dict(answer))
+        self._context_keys.append(context_key)
+        self._oov_tokens.append(oov_tokens)
+        self._last_used.append(self._tick())
+        self._matrix = None
+
+    def _evict(self):
+        """Вытеснение давно неиспользуемого ответа"""
+        idx = int(np.argmin(self._last_used))
+        for storage in (self._vectors, self._answers, self._context_keys, self._oov_tokens, self._last_used):
+            del storage[idx]
+        self._matrix = None
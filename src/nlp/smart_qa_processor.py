@@ -1,7 +1,9 @@
 import logging
 import re
+import heapq
+import functools
 from typing import Dict, List, Optional, Tuple
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 from src.database.db_manager import DatabaseManager
 from src.nlp.qa_processor import QAProcessor
@@ -9,72 +11,286 @@ from src.nlp.qa_processor import QAProcessor
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Ключевые слова тем курсов в порядке приоритета
+TOPIC_KEYWORDS = [
+    ('machine_learning', ('machine learning', 'машинное обучение', 'мо')),
+    ('deep_learning', ('deep learning', 'глубокое обучение', 'нейронные сети')),
+    ('computer_vision', ('computer vision', 'компьютерное зрение', 'cv', 'изображение')),
+    ('nlp', ('nlp', 'natural language', 'язык')),
+    ('python', ('python',))
+]
+
+# Теги и подстроки названий курсов, относящие курс к теме
+TOPIC_TAGS = {
+    'machine_learning': frozenset({'machine learning', 'ml'}),
+    'deep_learning': frozenset({'deep learning', 'neural networks'}),
+    'computer_vision': frozenset({'computer vision', 'cv'}),
+    'nlp': frozenset({'nlp', 'natural language processing'}),
+    'python': frozenset({'python', 'programming'})
+}
+# Обратный индекс: тег -> темы, к которым он относит курс
+_TAG_TOPICS = defaultdict(set)
+for _topic, _tags in TOPIC_TAGS.items():
+    for _tag in _tags:
+        _TAG_TOPICS[_tag].add(_topic)
+_TAG_TOPICS = {tag: frozenset(topics) for tag, topics in _TAG_TOPICS.items()}
+
+TOPIC_NAME_SUBSTRINGS = {
+    'machine_learning': ('машинное обучение',),
+    'deep_learning': ('глубокое обучение',),
+    'computer_vision': ('изображени', 'зрени', 'vision'),
+    'nlp': ('язык',),
+    'python': ('python',)
+}
+
+# Названия тем для ответов: "Курсы по ..." и заголовки направлений
+_TOPIC_DISPLAY_NAMES = {
+    'machine_learning': 'машинному обучению',
+    'deep_learning': 'глубокому обучению',
+    'computer_vision': 'компьютерному зрению',
+    'nlp': 'обработке естественного языка',
+    'python': 'Python'
+}
+_TOPIC_DISPLAY_TITLES = {
+    'machine_learning': 'Машинное обучение',
+    'deep_learning': 'Глубокое обучение',
+    'computer_vision': 'Компьютерное зрение',
+    'nlp': 'Обработка языка',
+    'python': 'Python разработка'
+}
+
+def _non_capturing(pattern: str) -> str:
+    """Замена захватывающих групп на незахватывающие, чтобы lastgroup указывал на тип вопроса"""
+    return re.sub(r'(?<!\\)\((?!\?)', '(?:', pattern)
+
+def _build_master_pattern(patterns: List[Tuple[str, re.Pattern]], flags: int = 0) -> re.Pattern:
+    """Общий шаблон с именованными группами для списка (имя, шаблон)"""
+    return re.compile('|'.join(f"(?P<{name}>{pattern.pattern})" for name, pattern in patterns), flags)
+
+def _first_match(text: str, master: re.Pattern, patterns: List[Tuple[str, re.Pattern]]) -> Optional[str]:
+    """Первое по приоритету имя, чей шаблон находится в тексте (за один проход, если совпадений нет)"""
+    match = master.search(text)
+    if not match:
+        return None
+    
+    # Найденное имя может оказаться не самым приоритетным: проверяем идущие раньше него
+    for name, pattern in patterns:
+        if name == match.lastgroup or pattern.search(text):
+            return name
+    
+    return match.lastgroup
+
+_TOPIC_PATTERNS = [
+    (topic, re.compile('|'.join(map(re.escape, keywords))))
+    for topic, keywords in TOPIC_KEYWORDS
+]
+_TOPIC_MASTER_PATTERN = _build_master_pattern(_TOPIC_PATTERNS)
+
+# Подстроки названий курсов по темам - одна альтернатива на тему
+_TOPIC_NAME_PATTERNS = {
+    topic: re.compile('|'.join(map(re.escape, substrings)))
+    for topic, substrings in TOPIC_NAME_SUBSTRINGS.items()
+}
+
+# Статичные ответы, не зависящие от содержимого базы данных
+ADMISSION_ANSWER = """🎯 Требования для поступления:
+
+📋 **Необходимые документы:**
+• Диплом бакалавра или специалиста
+• Транскрипт с оценками
+• Мотивационное письмо
+• Портфолио проектов (рекомендуется)
+
+💻 **Вступительные испытания:**
+• Собеседование по профилю программы
+• Техническое задание (возможно)
+• Английский язык (базовый уровень)
+
+📅 **Сроки подачи документов:**
+• Обычно до июля текущего года
+• Точные даты смотрите на сайте ИТМО
+
+🔗 **Подробнее:** https://abit.itmo.ru/
+
+💡 Рекомендуется иметь опыт в программировании и математике"""
+
+CAREER_ANSWER = """💼 Карьерные перспективы выпускников:
+
+🤖 **После "Искусственный интеллект":**
+• Data Scientist / ML Engineer
+• Research Scientist
+• AI Architect
+• Computer Vision Engineer
+• NLP Engineer
+
+🚀 **После "AI-продукты":**
+• Product Manager (AI/ML)
+• AI Product Owner
+• ML Solutions Architect
+• Technical Product Manager
+• AI Consultant
+
+💰 **Средние зарплаты в РФ:**
+• Junior: 80-150k руб/мес
+• Middle: 150-300k руб/мес  
+• Senior: 300-500k+ руб/мес
+
+🌍 **Международные возможности:**
+• Удаленная работа в зарубежных компаниях
+• Релокация в IT-хабы
+• Участие в международных проектах
+
+🎓 Диплом ИТМО высоко ценится в IT-индустрии"""
+
+DURATION_ANSWER = """⏱️ Продолжительность обучения:
+
+📅 **Стандартная программа:**
+• 2 года (4 семестра)
+• Очная форма обучения
+• Полная занятость
+
+📚 **Структура:**
+• 1-й год: Базовые курсы + специализация
+• 2-й год: Продвинутые темы + дипломная работа
+
+⚡ **Интенсивность:**
+• ~20-30 часов в неделю
+• Лекции, семинары, практические работы
+• Самостоятельная работа и проекты
+
+🎓 **Выпуск:**
+• Защита магистерской диссертации
+• Получение диплома магистра ИТМО
+
+💡 Возможны индивидуальные траектории обучения"""
+
+# Типы вопросов со статичным ответом: для них базовый Q&A не вызывается
+_STATIC_ANSWERS = {
+    'admission_info': ADMISSION_ANSWER,
+    'career_prospects': CAREER_ANSWER,
+    'duration_info': DURATION_ANSWER
+}
+
+PROGRAM_COMPARISON_TIPS = (
+    "💡 **Рекомендации:**\n"
+    "• Выбирайте 'Искусственный интеллект' для углубленного изучения ИИ\n"
+    "• Выбирайте 'AI-продукты' для практического применения ИИ в продуктах\n\n"
+    "🤖 Анализ на основе сравнения учебных планов"
+)
+
+LEARNING_TRACKS_TIPS = (
+    "💡 **Варианты специализации:**\n\n"
+    "🤖 **Для исследователей:**\n"
+    "• Фокус на теоретические курсы\n"
+    "• Машинное и глубокое обучение\n"
+    "• Математическая статистика\n\n"
+    "💼 **Для практиков:**\n"
+    "• Python разработка\n"
+    "• Веб-приложения и продукты\n"
+    "• Прикладные проекты\n\n"
+    "🎯 **Для специалистов по данным:**\n"
+    "• Анализ данных\n"
+    "• Computer Vision или NLP\n"
+    "• Рекомендательные системы\n\n"
+    "📋 **Как выбрать:**\n"
+    "1. Определите цель: исследования или практика\n"
+    "2. Выберите основную программу\n"
+    "3. Сформируйте портфель элективов\n"
+    "4. Консультируйтесь с кураторами\n\n"
+    "🔍 Для персональных рекомендаций используйте 'Получить рекомендации'"
+)
+
 class SmartQAProcessor:
     """Улучшенная система Q&A - 'умный режим' без внешних API"""
     
+    __slots__ = (
+        'db', 'qa_processor', '_classify_cached', '_smart_responses', '_courses_by_program_index'
+    )
+    
+    # Шаблоны для улучшенной обработки вопросов
+    question_patterns = {
+        'courses_by_topic': [
+            r'курс.*?(machine learning|машинн\w+ обучени|ml)',
+            r'курс.*?(deep learning|глубок\w+ обучени|нейронн\w+ сет)',
+            r'курс.*?(computer vision|компьютерн\w+ зрени|cv|изображени)',
+            r'курс.*?(nlp|natural language|обработк\w+ язык)',
+            r'курс.*?(python|питон|программировани)',
+            r'курс.*?(data science|данн\w+|аналитик)',
+            r'курс.*?(статистик|математик)',
+            r'курс.*?(алгоритм|структур\w+ данн)'
+        ],
+        'program_comparison': [
+            r'разниц\w+ между программ',
+            r'сравни\w*.*?программ',
+            r'чем отличаются программы',
+            r'какую программу выбрать',
+            r'искусственный интеллект.*?ai[- ]?продукт',
+            r'ai[- ]?продукт.*?искусственный интеллект'
+        ],
+        'learning_tracks': [
+            r'траектори\w+',
+            r'специализаци\w+',
+            r'направлени\w+.*?обучени',
+            r'варианты.*?обучени',
+            r'пути.*?развити',
+            r'какие.*?области.*?изучают',
+            r'выборные.*?дисциплины',
+            r'элективы',
+            r'track'
+        ],
+        'admission_info': [
+            r'как поступить',
+            r'требовани\w+ для поступлени',
+            r'вступительн\w+ испытани',
+            r'экзамен',
+            r'поступлени'
+        ],
+        'career_prospects': [
+            r'карьерн\w+ перспектив',
+            r'где работать',
+            r'трудоустройств',
+            r'работ\w+ после',
+            r'зарплат'
+        ],
+        'duration_info': [
+            r'сколько.*?длится',
+            r'продолжительность',
+            r'срок обучени',
+            r'как долго'
+        ]
+    }
+    
     def __init__(self, db_manager: DatabaseManager = None):
         self.db = db_manager or DatabaseManager()
         self.qa_processor = QAProcessor(self.db)
         
-        # Шаблоны для улучшенной обработки вопросов
-        self.question_patterns = {
-            'courses_by_topic': [
-                r'курс.*?(machine learning|машинн\w+ обучени|ml)',
-                r'курс.*?(deep learning|глубок\w+ обучени|нейронн\w+ сет)',
-                r'курс.*?(computer vision|компьютерн\w+ зрени|cv|изображени)',
-                r'курс.*?(nlp|natural language|обработк\w+ язык)',
-                r'курс.*?(python|питон|программировани)',
-                r'курс.*?(data science|данн\w+|аналитик)',
-                r'курс.*?(статистик|математик)',
-                r'курс.*?(алгоритм|структур\w+ данн)'
-            ],
-            'program_comparison': [
-                r'разниц\w+ между программ',
-                r'сравни\w*.*?программ',
-                r'чем отличаются программы',
-                r'какую программу выбрать',
-                r'искусственный интеллект.*?ai[- ]?продукт',
-                r'ai[- ]?продукт.*?искусственный интеллект'
-            ],
-            'learning_tracks': [
-                r'траектори\w+',
-                r'специализаци\w+',
-                r'направлени\w+.*?обучени',
-                r'варианты.*?обучени',
-                r'пути.*?развити',
-                r'какие.*?области.*?изучают',
-                r'выборные.*?дисциплины',
-                r'элективы',
-                r'track'
-            ],
-            'admission_info': [
-                r'как поступить',
-                r'требовани\w+ для поступлени',
-                r'вступительн\w+ испытани',
-                r'экзамен',
-                r'поступлени'
-            ],
-            'career_prospects': [
-                r'карьерн\w+ перспектив',
-                r'где работать',
-                r'трудоустройств',
-                r'работ\w+ после',
-                r'зарплат'
-            ],
-            'duration_info': [
-                r'сколько.*?длится',
-                r'продолжительность',
-                r'срок обучени',
-                r'как долго'
-            ]
-        }
+        # Данные из БД загружаются лениво, при первом обращении
+        self._smart_responses = None
+        self._courses_by_program_index = None
         
-        # Умные ответы на основе анализа базы знаний
-        self.smart_responses = {}
-        self._build_smart_responses()
+        # Кэш классификации: одни и те же вопросы задаются многократно
+        self._classify_cached = functools.lru_cache(maxsize=2048)(self._classify_question)
+    
+    @property
+    def smart_responses(self) -> Dict:
+        """Умные ответы на основе анализа базы знаний (строятся при первом обращении)"""
+        if self._smart_responses is None:
+            self._smart_responses = self._build_smart_responses()
+        return self._smart_responses
+    
+    @property
+    def _courses_by_program(self) -> Dict[int, List[Dict]]:
+        """Курсы, сгруппированные по программам, чтобы не запрашивать их из БД для каждой программы"""
+        if self._courses_by_program_index is None:
+            courses_by_program = defaultdict(list)
+            for course in self.db.get_all_courses():
+                courses_by_program[course['program_id']].append(course)
+            self._courses_by_program_index = courses_by_program
+        return self._courses_by_program_index
     
-    def _build_smart_responses(self):
+    def _build_smart_responses(self) -> Dict:
         """Построение умных ответов на основе данных из БД"""
+        smart_responses = {}
         
         # Получаем все данные
         programs = self.db.get_all_programs()
@@ -82,67 +298,68 @@ class SmartQAProcessor:
         
         # Анализируем курсы по темам
         courses_by_topic = defaultdict(list)
+        topic_counts_by_program = defaultdict(Counter)
         for course in courses:
-            tags = course.get('tags', [])
+            # Темы по тегам курса - один поиск в словаре на тег
+            tag_topics = set()
+            for tag in course.get('tags', []):
+                tag_topics.update(_TAG_TOPICS.get(tag.lower(), ()))
             name = course['name'].lower()
             
-            # Классифицируем курсы
-            if any(tag.lower() in ['machine learning', 'ml'] for tag in tags) or 'машинное обучение' in name:
-                courses_by_topic['machine_learning'].append(course)
-            
-            if any(tag.lower() in ['deep learning', 'neural networks'] for tag in tags) or 'глубокое обучение' in name:
-                courses_by_topic['deep_learning'].append(course)
-            
-            if any(tag.lower() in ['computer vision', 'cv'] for tag in tags) or any(word in name for word in ['изображени', 'зрени', 'vision']):
-                courses_by_topic['computer_vision'].append(course)
-            
-            if any(tag.lower() in ['nlp', 'natural language processing'] for tag in tags) or 'язык' in name:
-                courses_by_topic['nlp'].append(course)
-            
-            if any(tag.lower() in ['python', 'programming'] for tag in tags) or 'python' in name:
-                courses_by_topic['python'].append(course)
+            # Классифицируем курсы: тема по тегам или подстрока в названии
+            for topic, name_pattern in _TOPIC_NAME_PATTERNS.items():
+                if topic in tag_topics or name_pattern.search(name):
+                    courses_by_topic[topic].append(course)
+                    topic_counts_by_program[course['program_id']][topic] += 1
         
         # Строим умные ответы
-        self.smart_responses['courses_by_topic'] = courses_by_topic
+        smart_responses['courses_by_topic'] = courses_by_topic
+        smart_responses['topic_counts_by_program'] = topic_counts_by_program
+        
+        # Структура программ: курсы по семестрам и число обязательных/элективных курсов
+        semester_index = defaultdict(dict)
+        mandatory_counts = defaultdict(lambda: [0, 0])
+        for course in courses:
+            program_id = course['program_id']
+            semester_index[program_id].setdefault(course.get('semester', 'Не указан'), []).append(course)
+            if course.get('is_mandatory', False):
+                mandatory_counts[program_id][0] += 1
+            elif not course.get('is_mandatory', True):
+                mandatory_counts[program_id][1] += 1
+        
+        smart_responses['semester_index'] = semester_index
+        smart_responses['mandatory_counts'] = {pid: tuple(counts) for pid, counts in mandatory_counts.items()}
         
         # Сравнение программ
         if len(programs) >= 2:
-            ai_program = next((p for p in programs if 'искусственный интеллект' in p['name'].lower()), None)
-            ai_product_program = next((p for p in programs if 'ai-продукт' in p['name'].lower()), None)
+            # Ищем обе программы за один проход, приводя название к нижнему регистру один раз
+            ai_program = ai_product_program = None
+            for program in programs:
+                name = program['name'].casefold()
+                if ai_program is None and 'искусственный интеллект' in name:
+                    ai_program = program
+                if ai_product_program is None and 'ai-продукт' in name:
+                    ai_product_program = program
             
             if ai_program and ai_product_program:
-                ai_courses = self.db.get_courses_by_program(ai_program['id'])
-                product_courses = self.db.get_courses_by_program(ai_product_program['id'])
+                ai_courses = self._courses_by_program.get(ai_program['id'], [])
+                product_courses = self._courses_by_program.get(ai_product_program['id'], [])
                 
                 comparison = self._generate_program_comparison(ai_program, ai_product_program, ai_courses, product_courses)
-                self.smart_responses['program_comparison'] = comparison
+                smart_responses['program_comparison'] = comparison
+        
+        return smart_responses
     
     def _generate_program_comparison(self, ai_program, product_program, ai_courses, product_courses):
         """Генерация сравнения программ на основе анализа курсов"""
         
-        ai_tags = defaultdict(int)
-        product_tags = defaultdict(int)
-        
         # Анализируем теги курсов
-        for course in ai_courses:
-            for tag in course.get('tags', []):
-                ai_tags[tag] += 1
+        ai_tags = Counter(tag for course in ai_courses for tag in course.get('tags', []))
+        product_tags = Counter(tag for course in product_courses for tag in course.get('tags', []))
         
-        for course in product_courses:
-            for tag in course.get('tags', []):
-                product_tags[tag] += 1
-        
-        # Находим уникальные особенности
-        ai_unique = []
-        product_unique = []
-        
-        for tag, count in ai_tags.items():
-            if count > product_tags.get(tag, 0):
-                ai_unique.append(tag)
-        
-        for tag, count in product_tags.items():
-            if count > ai_tags.get(tag, 0):
-                product_unique.append(tag)
+        # Находим уникальные особенности: теги, которых в программе больше, чем в другой
+        ai_unique = [tag for tag, _ in (ai_tags - product_tags).most_common(5)]
+        product_unique = [tag for tag, _ in (product_tags - ai_tags).most_common(5)]
         
         comparison = {
             'ai_program': {
@@ -161,28 +378,37 @@ class SmartQAProcessor:
         
         return comparison
     
-    def detect_question_type(self, question: str) -> str:
+    def detect_question_type(self, question: str, question_lower: Optional[str] = None) -> str:
         """Определение типа вопроса для умного ответа"""
-        question_lower = question.lower()
-        
-        for question_type, patterns in self.question_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, question_lower, re.IGNORECASE):
-                    return question_type
-        
-        return 'general'
+        return self._classify_cached(question_lower if question_lower is not None else question.lower())
+    
+    def _classify_question(self, question_lower: str) -> str:
+        """Классификация вопроса в нижнем регистре"""
+        return _first_match(question_lower, _QUESTION_MASTER_PATTERN, _QUESTION_PATTERNS) or 'general'
     
     def generate_smart_answer(self, user_question: str, user_context: Dict = None) -> Dict:
         """Генерация умного ответа без внешних API"""
         
-        question_type = self.detect_question_type(user_question)
+        # Вопрос приводится к нижнему регистру один раз и передается во все помощники
+        question_lower = user_question.lower()
+        question_type = self.detect_question_type(user_question, question_lower)
+        
+        # Статичный ответ не зависит от базового Q&A - не тратим время на поиск
+        if question_type in _STATIC_ANSWERS:
+            return {
+                'answer': _STATIC_ANSWERS[question_type],
+                'confidence': 0.85,
+                'method': 'smart_local',
+                'question_type': question_type,
+                'is_ai_generated': True
+            }
         
         # Сначала пробуем базовый Q&A
         base_result = self.qa_processor.get_answer(user_question)
         
         # Если базовый ответ хороший, используем его с улучшениями
         if base_result['confidence'] > 0.7:
-            enhanced_answer = self._enhance_answer(base_result['answer'], question_type, user_question)
+            enhanced_answer = self._enhance_answer(base_result['answer'], question_type, user_question, question_lower)
             return {
                 'answer': enhanced_answer,
                 'confidence': min(base_result['confidence'] + 0.1, 1.0),
@@ -191,7 +417,7 @@ class SmartQAProcessor:
             }
         
         # Иначе генерируем умный ответ
-        smart_answer = self._generate_smart_response(question_type, user_question, user_context)
+        smart_answer = self._generate_smart_response(question_type, user_question, user_context, question_lower)
         
         if smart_answer:
             return {
@@ -205,37 +431,39 @@ class SmartQAProcessor:
         # Fallback к базовому ответу
         return base_result
     
-    def _enhance_answer(self, base_answer: str, question_type: str, user_question: str) -> str:
+    def _enhance_answer(self, base_answer: str, question_type: str, user_question: str,
+                        question_lower: Optional[str] = None) -> str:
         """Улучшение базового ответа дополнительной информацией"""
         
-        enhanced = base_answer
+        parts = [base_answer]
         
         # Добавляем связанные курсы если вопрос о курсах
         if question_type == 'courses_by_topic':
-            topic = self._extract_topic_from_question(user_question)
+            topic = self._extract_topic_from_question(user_question, question_lower)
             if topic and topic in self.smart_responses['courses_by_topic']:
                 courses = self.smart_responses['courses_by_topic'][topic][:3]
                 if courses:
-                    enhanced += f"\n\n🎓 Релевантные курсы:\n"
+                    parts.append(f"\n\n🎓 Релевантные курсы:\n")
                     for course in courses:
-                        enhanced += f"• {course['name']} ({course.get('program_name', 'Неизвестно')})\n"
+                        parts.append(f"• {course['name']} ({course.get('program_name', 'Неизвестно')})\n")
         
         # Добавляем связанные вопросы
         related = self.qa_processor.get_related_questions(user_question, top_k=2)
         if related:
-            enhanced += f"\n\n💡 Возможно, вас также интересует:\n"
+            parts.append(f"\n\n💡 Возможно, вас также интересует:\n")
             for rel in related:
-                enhanced += f"• {rel['question']}\n"
+                parts.append(f"• {rel['question']}\n")
         
-        enhanced += f"\n\n🤖 Ответ улучшен умной системой анализа"
+        parts.append(f"\n\n🤖 Ответ улучшен умной системой анализа")
         
-        return enhanced
+        return ''.join(parts)
     
-    def _generate_smart_response(self, question_type: str, user_question: str, user_context: Dict = None) -> Optional[str]:
+    def _generate_smart_response(self, question_type: str, user_question: str, user_context: Dict = None,
+                                 question_lower: Optional[str] = None) -> Optional[str]:
         """Генерация умного ответа на основе анализа базы знаний"""
         
         if question_type == 'courses_by_topic':
-            return self._answer_courses_by_topic(user_question)
+            return self._answer_courses_by_topic(user_question, question_lower)
         
         elif question_type == 'program_comparison':
             return self._answer_program_comparison()
@@ -254,26 +482,15 @@ class SmartQAProcessor:
         
         return None
     
-    def _extract_topic_from_question(self, question: str) -> Optional[str]:
+    def _extract_topic_from_question(self, question: str, question_lower: Optional[str] = None) -> Optional[str]:
         """Извлечение темы из вопроса о курсах"""
-        question_lower = question.lower()
-        
-        if any(word in question_lower for word in ['machine learning', 'машинное обучение', 'мо']):
-            return 'machine_learning'
-        elif any(word in question_lower for word in ['deep learning', 'глубокое обучение', 'нейронные сети']):
-            return 'deep_learning'
-        elif any(word in question_lower for word in ['computer vision', 'компьютерное зрение', 'cv', 'изображение']):
-            return 'computer_vision'
-        elif any(word in question_lower for word in ['nlp', 'natural language', 'язык']):
-            return 'nlp'
-        elif 'python' in question_lower:
-            return 'python'
-        
-        return None
+        if question_lower is None:
+            question_lower = question.lower()
+        return _first_match(question_lower, _TOPIC_MASTER_PATTERN, _TOPIC_PATTERNS)
     
-    def _answer_courses_by_topic(self, question: str) -> str:
+    def _answer_courses_by_topic(self, question: str, question_lower: Optional[str] = None) -> str:
         """Ответ на вопросы о курсах по теме"""
-        topic = self._extract_topic_from_question(question)
+        topic = self._extract_topic_from_question(question, question_lower)
         
         if not topic or topic not in self.smart_responses['courses_by_topic']:
             return "🔍 Не могу найти курсы по указанной теме. Попробуйте переформулировать вопрос."
@@ -283,27 +500,19 @@ class SmartQAProcessor:
         if not courses:
             return "📚 К сожалению, курсы по этой теме не найдены в базе данных."
         
-        topic_names = {
-            'machine_learning': 'машинному обучению',
-            'deep_learning': 'глубокому обучению',
-            'computer_vision': 'компьютерному зрению',
-            'nlp': 'обработке естественного языка',
-            'python': 'Python'
-        }
-        
-        answer = f"🎓 Курсы по {topic_names.get(topic, 'указанной теме')}:\n\n"
+        parts = [f"🎓 Курсы по {_TOPIC_DISPLAY_NAMES.get(topic, 'указанной теме')}:\n\n"]
         
         for i, course in enumerate(courses[:5], 1):
-            answer += f"{i}. {course['name']}\n"
-            answer += f"   📚 Программа: {course.get('program_name', 'Неизвестно')}\n"
-            answer += f"   📅 Семестр: {course.get('semester', 'Не указан')}\n"
+            parts.append(f"{i}. {course['name']}\n")
+            parts.append(f"   📚 Программа: {course.get('program_name', 'Неизвестно')}\n")
+            parts.append(f"   📅 Семестр: {course.get('semester', 'Не указан')}\n")
             if course.get('tags'):
-                answer += f"   🏷️ Теги: {', '.join(course['tags'][:3])}\n"
-            answer += "\n"
+                parts.append(f"   🏷️ Теги: {', '.join(course['tags'][:3])}\n")
+            parts.append("\n")
         
-        answer += "💡 Для получения персональных рекомендаций нажмите 'Получить рекомендации'"
+        parts.append("💡 Для получения персональных рекомендаций нажмите 'Получить рекомендации'")
         
-        return answer
+        return ''.join(parts)
     
     def _answer_program_comparison(self) -> str:
         """Ответ на вопросы о сравнении программ"""
@@ -314,27 +523,23 @@ class SmartQAProcessor:
         ai_prog = comp['ai_program']
         prod_prog = comp['product_program']
         
-        answer = "🎓 Сравнение программ ИТМО:\n\n"
+        parts = ["🎓 Сравнение программ ИТМО:\n\n"]
         
-        answer += f"🧠 **{ai_prog['name']}**\n"
-        answer += f"📚 Курсов: {ai_prog['courses_count']}\n"
+        parts.append(f"🧠 **{ai_prog['name']}**\n")
+        parts.append(f"📚 Курсов: {ai_prog['courses_count']}\n")
         if ai_prog['unique_focus']:
-            answer += f"🎯 Особый фокус: {', '.join(ai_prog['unique_focus'][:3])}\n"
-        answer += f"📖 {ai_prog['description'][:200]}...\n\n"
+            parts.append(f"🎯 Особый фокус: {', '.join(ai_prog['unique_focus'][:3])}\n")
+        parts.append(f"📖 {ai_prog['description'][:200]}...\n\n")
         
-        answer += f"🚀 **{prod_prog['name']}**\n"
-        answer += f"📚 Курсов: {prod_prog['courses_count']}\n"
+        parts.append(f"🚀 **{prod_prog['name']}**\n")
+        parts.append(f"📚 Курсов: {prod_prog['courses_count']}\n")
         if prod_prog['unique_focus']:
-            answer += f"🎯 Особый фокус: {', '.join(prod_prog['unique_focus'][:3])}\n"
-        answer += f"📖 {prod_prog['description'][:200]}...\n\n"
+            parts.append(f"🎯 Особый фокус: {', '.join(prod_prog['unique_focus'][:3])}\n")
+        parts.append(f"📖 {prod_prog['description'][:200]}...\n\n")
         
-        answer += "💡 **Рекомендации:**\n"
-        answer += "• Выбирайте 'Искусственный интеллект' для углубленного изучения ИИ\n"
-        answer += "• Выбирайте 'AI-продукты' для практического применения ИИ в продуктах\n\n"
+        parts.append(PROGRAM_COMPARISON_TIPS)
         
-        answer += "🤖 Анализ на основе сравнения учебных планов"
-        
-        return answer
+        return ''.join(parts)
     
     def _answer_learning_tracks(self) -> str:
         """Ответ на вопросы о траекториях и специализациях"""
@@ -342,163 +547,66 @@ class SmartQAProcessor:
         # Получаем курсы по программам
         programs = self.db.get_all_programs()
         
-        answer = "🛤️ Траектории обучения в ИТМО:\n\n"
+        parts = ["🛤️ Траектории обучения в ИТМО:\n\n"]
         
         for program in programs:
-            courses = self.db.get_courses_by_program(program['id'])
-            
-            # Анализируем курсы по категориям
-            mandatory_courses = [c for c in courses if c.get('is_mandatory', False)]
-            elective_courses = [c for c in courses if not c.get('is_mandatory', True)]
+            courses = self._courses_by_program.get(program['id'], [])
             
-            # Группируем по семестрам
-            courses_by_semester = {}
-            for course in courses:
-                semester = course.get('semester', 'Не указан')
-                if semester not in courses_by_semester:
-                    courses_by_semester[semester] = []
-                courses_by_semester[semester].append(course)
+            # Категории и семестры посчитаны один раз при построении умных ответов
+            mandatory_count, elective_count = self.smart_responses['mandatory_counts'].get(program['id'], (0, 0))
+            courses_by_semester = self.smart_responses['semester_index'].get(program['id'], {})
             
-            answer += f"📚 **{program['name']}**\n"
-            answer += f"📖 Всего курсов: {len(courses)}\n"
-            answer += f"⭐ Обязательных: {len(mandatory_courses)}\n"
-            answer += f"🎯 Элективных: {len(elective_courses)}\n\n"
+            parts.append(f"📚 **{program['name']}**\n")
+            parts.append(f"📖 Всего курсов: {len(courses)}\n")
+            parts.append(f"⭐ Обязательных: {mandatory_count}\n")
+            parts.append(f"🎯 Элективных: {elective_count}\n\n")
             
             # Показываем основные направления
-            if 'courses_by_topic' in self.smart_responses:
-                topics = self.smart_responses['courses_by_topic']
-                program_topics = []
-                
-                for topic, topic_courses in topics.items():
-                    # Фильтруем курсы этой программы
-                    program_topic_courses = [c for c in topic_courses if c.get('program') == program['id']]
-                    if program_topic_courses:
-                        topic_names = {
-                            'machine_learning': 'Машинное обучение',
-                            'deep_learning': 'Глубокое обучение', 
-                            'computer_vision': 'Компьютерное зрение',
-                            'nlp': 'Обработка языка',
-                            'python': 'Python разработка'
-                        }
-                        program_topics.append(f"  • {topic_names.get(topic, topic.title())} ({len(program_topic_courses)} курсов)")
-                
-                if program_topics:
-                    answer += "🎯 **Основные направления:**\n"
-                    answer += "\n".join(program_topics[:5])
-                    answer += "\n\n"
+            # Число курсов программы по темам посчитано при построении умных ответов
+            topic_counts = self.smart_responses['topic_counts_by_program'].get(program['id'])
+            if topic_counts:
+                program_topics = [
+                    f"  • {_TOPIC_DISPLAY_TITLES.get(topic, topic.title())} ({count} курсов)"
+                    for topic, count in topic_counts.most_common(5)
+                ]
+                parts.append("🎯 **Основные направления:**\n")
+                parts.append("\n".join(program_topics))
+                parts.append("\n\n")
             
             # Показываем структуру по семестрам
-            answer += "📅 **Структура обучения:**\n"
-            sorted_semesters = sorted([k for k in courses_by_semester.keys() if k != 'Не указан'])
-            for semester in sorted_semesters[:4]:  # Показываем первые 4 семестра
+            parts.append("📅 **Структура обучения:**\n")
+            # Показываем первые 4 семестра - полная сортировка не нужна
+            for semester in heapq.nsmallest(4, (k for k in courses_by_semester if k != 'Не указан')):
                 sem_courses = courses_by_semester[semester]
-                answer += f"  {semester}: {len(sem_courses)} курсов\n"
+                parts.append(f"  {semester}: {len(sem_courses)} курсов\n")
             
-            answer += "\n" + "─" * 30 + "\n\n"
+            parts.append("\n" + "─" * 30 + "\n\n")
         
         # Общие рекомендации
-        answer += "💡 **Варианты специализации:**\n\n"
-        answer += "🤖 **Для исследователей:**\n"
-        answer += "• Фокус на теоретические курсы\n"
-        answer += "• Машинное и глубокое обучение\n"
-        answer += "• Математическая статистика\n\n"
-        
-        answer += "💼 **Для практиков:**\n"
-        answer += "• Python разработка\n"
-        answer += "• Веб-приложения и продукты\n"
-        answer += "• Прикладные проекты\n\n"
-        
-        answer += "🎯 **Для специалистов по данным:**\n"
-        answer += "• Анализ данных\n"
-        answer += "• Computer Vision или NLP\n"
-        answer += "• Рекомендательные системы\n\n"
-        
-        answer += "📋 **Как выбрать:**\n"
-        answer += "1. Определите цель: исследования или практика\n"
-        answer += "2. Выберите основную программу\n"
-        answer += "3. Сформируйте портфель элективов\n"
-        answer += "4. Консультируйтесь с кураторами\n\n"
-        
-        answer += "🔍 Для персональных рекомендаций используйте 'Получить рекомендации'"
-        
-        return answer
+        parts.append(LEARNING_TRACKS_TIPS)
+        
+        return ''.join(parts)
     
     def _answer_admission_info(self) -> str:
         """Ответ на вопросы о поступлении"""
-        return """🎯 Требования для поступления:
-
-📋 **Необходимые документы:**
-• Диплом бакалавра или специалиста
-• Транскрипт с оценками
-• Мотивационное письмо
-• Портфолио проектов (рекомендуется)
-
-💻 **Вступительные испытания:**
-• Собеседование по профилю программы
-• Техническое задание (возможно)
-• Английский язык (базовый уровень)
-
-📅 **Сроки подачи документов:**
-• Обычно до июля текущего года
-• Точные даты смотрите на сайте ИТМО
-
-🔗 **Подробнее:** https://abit.itmo.ru/
-
-💡 Рекомендуется иметь опыт в программировании и математике"""
+        return ADMISSION_ANSWER
     
     def _answer_career_prospects(self) -> str:
         """Ответ на вопросы о карьерных перспективах"""
-        return """💼 Карьерные перспективы выпускников:
-
-🤖 **После "Искусственный интеллект":**
-• Data Scientist / ML Engineer
-• Research Scientist
-• AI Architect
-• Computer Vision Engineer
-• NLP Engineer
-
-🚀 **После "AI-продукты":**
-• Product Manager (AI/ML)
-• AI Product Owner
-• ML Solutions Architect
-• Technical Product Manager
-• AI Consultant
-
-💰 **Средние зарплаты в РФ:**
-• Junior: 80-150k руб/мес
-• Middle: 150-300k руб/мес  
-• Senior: 300-500k+ руб/мес
-
-🌍 **Международные возможности:**
-• Удаленная работа в зарубежных компаниях
-• Релокация в IT-хабы
-• Участие в международных проектах
-
-🎓 Диплом ИТМО высоко ценится в IT-индустрии"""
+        return CAREER_ANSWER
     
     def _answer_duration_info(self) -> str:
         """Ответ на вопросы о продолжительности обучения"""
-        return """⏱️ Продолжительность обучения:
-
-📅 **Стандартная программа:**
-• 2 года (4 семестра)
-• Очная форма обучения
-• Полная занятость
+        return DURATION_ANSWER
 
-📚 **Структура:**
-• 1-й год: Базовые курсы + специализация
-• 2-й год: Продвинутые темы + дипломная работа
-
-⚡ **Интенсивность:**
-• ~20-30 часов в неделю
-• Лекции, семинары, практические работы
-• Самостоятельная работа и проекты
-
-🎓 **Выпуск:**
-• Защита магистерской диссертации
-• Получение диплома магистра ИТМО
-
-💡 Возможны индивидуальные траектории обучения"""
+# Шаблоны компилируются один раз при импорте: для каждого типа - одна альтернатива из всех его шаблонов.
+# Вопрос всегда приводится к нижнему регистру, поэтому шаблоны тоже в нижнем регистре и без IGNORECASE
+_QUESTION_PATTERNS = [
+    (question_type, re.compile('|'.join(_non_capturing(pattern.lower()) for pattern in patterns)))
+    for question_type, patterns in SmartQAProcessor.question_patterns.items()
+]
+# Общий шаблон с именованными группами: один проход по строке для всех типов
+_QUESTION_MASTER_PATTERN = _build_master_pattern(_QUESTION_PATTERNS)
 
 if __name__ == "__main__":
     # Тестирование умной системы
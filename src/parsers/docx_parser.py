@@ -1,78 +1,377 @@
 import re
 import logging
+import zipfile
+import functools
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Optional, Tuple
-from docx import Document
+from lxml import etree
 from dataclasses import dataclass
 import os
 
 from src.parsers.itmo_parser import Course, Program
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Паттерны для поиска продолжительности обучения (в порядке приоритета)
+DURATION_PATTERNS = [
+    re.compile(r'срок\s+обучения[:\s]*(\d+)\s*(года?|лет)', re.IGNORECASE),
+    re.compile(r'продолжительность[:\s]*(\d+)\s*(года?|лет)', re.IGNORECASE),
+    re.compile(r'(\d+)\s*(года?|лет)\s*обучения', re.IGNORECASE),
+    re.compile(r'магистратура[:\s]*(\d+)\s*(года?|лет)', re.IGNORECASE)
+]
+
+# Все паттерны продолжительности одной альтернативой: обычно хватает одного прохода по тексту
+DURATION_UNION = re.compile(
+    '|'.join(f'(?P<p{i}>{pattern.pattern})' for i, pattern in enumerate(DURATION_PATTERNS)),
+    re.IGNORECASE
+)
+
+# Паттерны для поиска должностей.
+# Одно-три слова перед должностью записаны без вложенного квантификатора (\w+\s*){1,3}:
+# он допускал множество разбиений одного слова и давал катастрофический бэктрекинг на длинных словах.
+# \b в начале не дает \w+ стартовать с каждой позиции внутри длинного слова (иначе поиск квадратичный)
+JOB_PATTERNS = [
+    re.compile(r'\b\w+(?:\s+\w+){0,2}\s*(?:инженер|менеджер|аналитик|разработчик|специалист|консультант)', re.IGNORECASE),
+    re.compile(r'(?:ML|AI|Data)\s+\w+', re.IGNORECASE),
+    re.compile(r'\b\w+\s+Scientist', re.IGNORECASE),
+    re.compile(r'Product\s+Manager', re.IGNORECASE)
+]
+
+CREDITS_RE = re.compile(r'\d+')
+
+# Основные теги курсов на основе ключевых слов в названии
+TAG_KEYWORDS = {
+    'Machine Learning': [
+        'машинное обучение', 'machine learning', 'ml', 'автоматическое машинное обучение',
+        'применения машинного обучения', 'введение в мо', 'продвинутое мо'
+    ],
+    'Deep Learning': [
+        'глубокое обучение', 'deep learning', 'нейронные сети', 'neural networks',
+        'основы глубокого обучения', 'глубокие нейронные сети'
+    ],
+    'Computer Vision': [
+        'компьютерное зрение', 'computer vision', 'cv', 'обработка изображений',
+        'распознавание образов', 'image processing', 'генерация изображений',
+        'обработка и генерация изображений', 'визуальный', 'изображение'
+    ],
+    'NLP': [
+        'обработка естественного языка', 'natural language processing', 'nlp',
+        'анализ текста', 'text mining', 'обработка языка', 'лингвистика',
+        'языковые модели', 'текстовый анализ'
+    ],
+    'Data Science': [
+        'data science', 'анализ данных', 'большие данные', 'big data',
+        'статистика', 'analytics', 'математическая статистика',
+        'анализ и обработка данных', 'визуализация данных'
+    ],
+    'Python': [
+        'python', 'программирование на python', 'python backend',
+        'разработка веб-приложений (python backend)', 'введение в мо (python)',
+        'продвинутое мо (python)'
+    ],
+    'Programming': [
+        'программирование', 'разработка', 'веб-приложений', 'backend',
+        'программирование на с++', 'алгоритмы и структуры данных'
+    ],
+    'Research': [
+        'исследования', 'research', 'научная работа', 'методология',
+        'анализ', 'теория', 'фундаментальные'
+    ],
+    'Algorithms': [
+        'алгоритм', 'структуры данных', 'алгоритмы и структуры данных',
+        'оптимизация', 'complexity'
+    ],
+    'Math': [
+        'математика', 'математическая', 'статистика', 'probability', 'вероятность',
+        'линейная алгебра', 'linear algebra', 'математическая статистика'
+    ],
+    'Recommender Systems': [
+        'рекомендательные системы', 'рекомендации', 'recommender systems',
+        'персонализация', 'collaborative filtering'
+    ],
+    'Web Development': [
+        'веб-разработка', 'web development', 'веб-приложения', 'backend',
+        'frontend', 'разработка веб-приложений'
+    ]
+}
+
+# Для каждого тега - одна альтернатива из всех его ключевых слов
+TAG_PATTERNS = [
+    (tag, re.compile('|'.join(map(re.escape, keywords))))
+    for tag, keywords in TAG_KEYWORDS.items()
+]
+
+# Ключевые слова для поиска требований к поступлению
+REQUIREMENT_KEYWORDS = (
+    'требования', 'поступление', 'вступительные', 'испытания',
+    'экзамен', 'конкурс', 'отбор'
+)
+REQUIREMENT_RE = re.compile('|'.join(map(re.escape, REQUIREMENT_KEYWORDS)))
+
+# Ключевые слова для карьерных перспектив
+CAREER_KEYWORDS = (
+    'карьера', 'трудоустройство', 'работа', 'профессия',
+    'деятельность', 'специалист', 'должность'
+)
+CAREER_RE = re.compile('|'.join(map(re.escape, CAREER_KEYWORDS)))
+
+# Явно нерелевантные фрагменты названий курсов
+INVALID_NAME_PATTERNS = frozenset({
+    'изначально я учился',
+    'вступительные испытания',
+    'основные даты',
+    'показать все',
+    'http',
+    'www',
+    'подробнее',
+    'читать далее',
+    '20241/5',  # Рейтинги и даты
+    'никита борисов',  # Имена людей
+    'ai talent hub'  # Названия программ
+})
+
+# Признаки настоящего курса в названии
+COURSE_INDICATORS = frozenset({
+    'анализ', 'программирование', 'алгоритм', 'метод', 'основы',
+    'введение', 'технология', 'система', 'обработка', 'разработка',
+    'математика', 'статистика', 'машинное', 'глубокое', 'обучение',
+    'искусственный', 'интеллект', 'данные', 'python', 'практика',
+    'теория', 'моделирование', 'проектирование', 'информатика'
+})
+
+# Основные признаки курса для строк из текста документа (без таблиц)
+TEXT_COURSE_INDICATORS = frozenset({
+    'анализ', 'программирование', 'алгоритм', 'метод', 'основы',
+    'введение', 'технология', 'система', 'обработка', 'разработка'
+})
+
+# Каждый набор проверяется одним поиском по альтернативе вместо цикла по подстрокам
+INVALID_NAME_RE = re.compile('|'.join(map(re.escape, sorted(INVALID_NAME_PATTERNS))))
+COURSE_INDICATOR_RE = re.compile('|'.join(map(re.escape, sorted(COURSE_INDICATORS))))
+TEXT_COURSE_INDICATOR_RE = re.compile('|'.join(map(re.escape, sorted(TEXT_COURSE_INDICATORS))))
+
+# Теги WordprocessingML, нужные для чтения текста документа
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+W_BODY = W_NS + 'body'
+W_P = W_NS + 'p'
+W_R = W_NS + 'r'
+W_HYPERLINK = W_NS + 'hyperlink'
+W_T = W_NS + 't'
+W_TAB = W_NS + 'tab'
+W_BR = W_NS + 'br'
+W_CR = W_NS + 'cr'
+W_TBL = W_NS + 'tbl'
+W_TR = W_NS + 'tr'
+W_TC = W_NS + 'tc'
+W_TC_PR = W_NS + 'tcPr'
+W_GRID_SPAN = W_NS + 'gridSpan'
+W_V_MERGE = W_NS + 'vMerge'
+W_VAL = W_NS + 'val'
+
+# Содержимое прогонов ячейки одним скомпилированным запросом (в порядке документа),
+# параграфы ячейки служат разделителями строк. Берутся только прогоны параграфа и его гиперссылок:
+# прогоны глубже (надписи w:txbxContent, продублированные в mc:Fallback) python-docx не читает
+CELL_CONTENT_XPATH = etree.XPath(
+    'w:p | ' + ' | '.join(
+        f'w:p/{run}/{content}'
+        for run in ('w:r', 'w:hyperlink/w:r')
+        for content in ('w:t', 'w:tab', 'w:br', 'w:cr')
+    ),
+    namespaces={'w': W_NS[1:-1]}
+)
+
+def _paragraph_runs(paragraph):
+    """Прогоны параграфа в порядке документа: прямые и внутри гиперссылок"""
+    for child in paragraph.iterchildren(W_R, W_HYPERLINK):
+        if child.tag == W_HYPERLINK:
+            yield from child.iterchildren(W_R)
+        else:
+            yield child
+
+def _paragraph_text(paragraph) -> str:
+    """Текст параграфа из его прогонов (как paragraph.text в python-docx)"""
+    parts = []
+    for run in _paragraph_runs(paragraph):
+        for child in run:
+            if child.tag == W_T:
+                parts.append(child.text or '')
+            elif child.tag == W_TAB:
+                parts.append('\t')
+            elif child.tag in (W_BR, W_CR):
+                parts.append('\n')
+    return ''.join(parts)
+
+def _cell_text(cell) -> str:
+    """Текст ячейки таблицы (как cell.text в python-docx) за один обход ее XML"""
+    parts = []
+    first_paragraph = True
+    for node in CELL_CONTENT_XPATH(cell):
+        tag = node.tag
+        if tag == W_P:
+            if not first_paragraph:
+                parts.append('\n')
+            first_paragraph = False
+        elif tag == W_T:
+            parts.append(node.text or '')
+        elif tag == W_TAB:
+            parts.append('\t')
+        else:
+            parts.append('\n')
+    return ''.join(parts)
+
+def _table_rows(table) -> List[List[str]]:
+    """Строки таблицы: объединенные ячейки повторяются в каждой колонке (как row.cells в python-docx)"""
+    rows = []
+    previous_row = []
+    for row in table.iterchildren(W_TR):
+        row_data = []
+        for cell in row.iterchildren(W_TC):
+            span, continues_merge = 1, False
+            properties = cell.find(W_TC_PR)
+            if properties is not None:
+                grid_span = properties.find(W_GRID_SPAN)
+                if grid_span is not None:
+                    span = int(grid_span.get(W_VAL, 1))
+                v_merge = properties.find(W_V_MERGE)
+                continues_merge = v_merge is not None and v_merge.get(W_VAL, 'continue') == 'continue'
+            
+            # Продолжение вертикального объединения берет текст верхней ячейки
+            column = len(row_data)
+            if continues_merge and column < len(previous_row):
+                text = previous_row[column]
+            else:
+                text = _cell_text(cell).strip()
+            row_data.extend([text] * span)
+        rows.append(row_data)
+        previous_row = row_data
+    return rows
+
+def read_docx_content(file_path: str) -> Tuple[List[str], List[List[List[str]]]]:
+    """Потоковое чтение параграфов и таблиц верхнего уровня из word/document.xml за один проход"""
+    paragraphs = []
+    tables_data = []
+    
+    with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as document:
+        # Параграфы и таблицы приходят из одного обхода XML в порядке документа
+        for _, elem in etree.iterparse(document, events=('end',), tag=(W_P, W_TBL)):
+            # Параграфы внутри таблиц читаются вместе с таблицей
+            if elem.getparent().tag != W_BODY:
+                continue
+            
+            if elem.tag == W_P:
+                text = _paragraph_text(elem).strip()
+                if text:
+                    paragraphs.append(text)
+            else:
+                tables_data.append(_table_rows(elem))
+            
+            # Освобождаем уже прочитанные элементы
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    
+    return paragraphs, tables_data
+
+def _is_header_text(text: str) -> bool:
+    """Проверка, является ли текст заголовком"""
+    return (len(text) < 50 or 
+            text.isupper() or 
+            text.startswith(('№', 'Код', 'Название', 'Форма', 'Срок')))
+
+@functools.lru_cache(maxsize=4096)
+def _classify_course_name(text: str) -> str:
+    """Классификация названия курса: 'invalid', 'valid' (ячейка таблицы) или 'text_candidate' (и параграф текста)"""
+    name = text.strip()
+    
+    # Слишком короткие или слишком длинные названия (вероятно захватился лишний текст)
+    if not 5 <= len(name) <= 150:
+        return 'invalid'
+    
+    # Исключаем явно нерелевантные названия
+    name_lower = name.lower()
+    if INVALID_NAME_RE.search(name_lower):
+        return 'invalid'
+    
+    # Нужен хотя бы один индикатор курса или аббревиатура из заглавных букв
+    has_indicator = COURSE_INDICATOR_RE.search(name_lower) is not None
+    if not has_indicator and not (name.isupper() and 10 <= len(name) <= 50):
+        return 'invalid'
+    
+    # Параграф текста считается курсом только с основным индикатором и если это не заголовок
+    if TEXT_COURSE_INDICATOR_RE.search(name_lower) and not _is_header_text(name):
+        return 'text_candidate'
+    
+    return 'valid'
+
+@functools.lru_cache(maxsize=4096)
+def _generate_course_tags_cached(course_name: str) -> Tuple[str, ...]:
+    """Генерация тегов для курса (неизменяемый результат для кэша)"""
+    
+    name_lower = course_name.lower()
+    
+    # Один поиск скомпилированной альтернативы на тег вместо проверки каждого ключевого слова.
+    # Каждый тег проверяется один раз, поэтому дубликатов нет и порядок тегов стабилен
+    return tuple(tag for tag, pattern in TAG_PATTERNS if pattern.search(name_lower))
+
 class DocxParser:
     def __init__(self):
         """Инициализация парсера Word документов"""
         self.current_program = None
         
-    def parse_docx_file(self, file_path: str) -> Optional[Program]:
+    def parse_docx_file(self, file_path: str, check_exists: bool = True) -> Optional[Program]:
         """Парсинг Word документа с программой"""
-        if not os.path.exists(file_path):
-            logger.error(f"Файл не найден: {file_path}")
+        if check_exists and not os.path.exists(file_path):
+            logger.error("Файл не найден: %s", file_path)
             return None
             
         try:
-            doc = Document(file_path)
-            logger.info(f"Парсинг файла: {file_path}")
-            
-            # Извлекаем весь текст из документа
-            full_text = ""
-            paragraphs = []
-            
-            for paragraph in doc.paragraphs:
-                text = paragraph.text.strip()
-                if text:
-                    full_text += text + "\n"
-                    paragraphs.append(text)
-            
-            # Также читаем таблицы если есть
-            tables_data = []
-            for table in doc.tables:
-                table_data = []
-                for row in table.rows:
-                    row_data = []
-                    for cell in row.cells:
-                        row_data.append(cell.text.strip())
-                    table_data.append(row_data)
-                tables_data.append(table_data)
-            
-            # Определяем программу по содержимому
-            program_info = self._extract_program_info(full_text, paragraphs, tables_data, file_path)
-            
-            return program_info
+            logger.info("Парсинг файла: %s", file_path)
+            return self._parse_docx_content(file_path)
             
         except Exception as e:
-            logger.error(f"Ошибка при парсинге файла {file_path}: {e}")
+            logger.error("Ошибка при парсинге файла %s: %s", file_path, e)
             return None
     
+    def _parse_docx_content(self, file_path: str) -> Program:
+        """Разбор содержимого документа (исключения передаются вызывающему)"""
+        # Читаем параграфы и таблицы напрямую из XML документа
+        paragraphs, tables_data = read_docx_content(file_path)
+        
+        # Извлекаем весь текст из документа
+        full_text = "\n".join(paragraphs) + "\n" if paragraphs else ""
+        
+        # Определяем программу по содержимому
+        return self._extract_program_info(full_text, paragraphs, tables_data, file_path)
+    
+    def _parse_docx_file_in_worker(self, file_path: str) -> Tuple[Optional[Program], Optional[str]]:
+        """Разбор файла в рабочем процессе: ошибка возвращается родителю, чтобы попасть в его лог"""
+        try:
+            return self._parse_docx_content(file_path), None
+        except Exception as e:
+            return None, str(e)
+    
     def _extract_program_info(self, full_text: str, paragraphs: List[str], 
                             tables_data: List, file_path: str) -> Program:
         """Извлечение информации о программе из содержимого документа"""
         
+        # Текст приводится к нижнему регистру один раз для всех извлечений
+        full_text_lower = full_text.lower()
+        paragraphs_lower = [paragraph.lower() for paragraph in paragraphs]
+        
         # Определяем название программы
-        program_name = self._extract_program_name(full_text, file_path)
+        program_name = self._extract_program_name(full_text, file_path, full_text_lower)
         
         # Извлекаем описание
         description = self._extract_description(paragraphs)
         
         # Извлекаем продолжительность
-        duration = self._extract_duration(full_text)
+        duration = self._extract_duration(full_text, full_text_lower)
         
         # Извлекаем требования к поступлению
-        admission_requirements = self._extract_admission_requirements(full_text, paragraphs)
+        admission_requirements = self._extract_admission_requirements(full_text, paragraphs, paragraphs_lower)
         
         # Извлекаем карьерные перспективы
-        career_prospects = self._extract_career_prospects(full_text, paragraphs)
+        career_prospects = self._extract_career_prospects(full_text, paragraphs, paragraphs_lower)
         
         # Извлекаем курсы из таблиц и текста
         courses = self._extract_courses_from_document(full_text, paragraphs, tables_data, program_name)
@@ -86,7 +385,7 @@ class DocxParser:
             career_prospects=career_prospects
         )
     
-    def _extract_program_name(self, full_text: str, file_path: str) -> str:
+    def _extract_program_name(self, full_text: str, file_path: str, text_lower: Optional[str] = None) -> str:
         """Извлечение названия программы"""
         
         # Ключевые слова для поиска названия программы
@@ -100,7 +399,8 @@ class DocxParser:
             'продукт', 'разработка продуктов'
         ]
         
-        text_lower = full_text.lower()
+        if text_lower is None:
+            text_lower = full_text.lower()
         
         # Определяем по ключевым словам
         if any(keyword in text_lower for keyword in ai_product_keywords):
@@ -126,59 +426,54 @@ class DocxParser:
         
         # Если не найден отдельный описательный параграф, составляем из первых параграфов
         description_parts = []
+        description_length = -1  # Длина будущей строки ' '.join(description_parts)
         for paragraph in paragraphs[:5]:
             if len(paragraph) > 50 and not self._is_header(paragraph):
                 description_parts.append(paragraph)
-                if len(' '.join(description_parts)) > 200:
+                description_length += len(paragraph) + 1
+                if description_length > 200:
                     break
         
         return ' '.join(description_parts) if description_parts else "Описание программы"
     
     def _is_header(self, text: str) -> bool:
         """Проверка, является ли текст заголовком"""
-        return (len(text) < 50 or 
-                text.isupper() or 
-                text.startswith(('№', 'Код', 'Название', 'Форма', 'Срок')))
+        return _is_header_text(text)
     
-    def _extract_duration(self, full_text: str) -> str:
+    def _extract_duration(self, full_text: str, text_lower: Optional[str] = None) -> str:
         """Извлечение продолжительности обучения"""
         
-        # Паттерны для поиска продолжительности
-        duration_patterns = [
-            r'срок\s+обучения[:\s]*(\d+)\s*(года?|лет)',
-            r'продолжительность[:\s]*(\d+)\s*(года?|лет)',
-            r'(\d+)\s*(года?|лет)\s*обучения',
-            r'магистратура[:\s]*(\d+)\s*(года?|лет)'
-        ]
+        if text_lower is None:
+            text_lower = full_text.lower()
+        
+        match = DURATION_UNION.search(text_lower)
+        if not match:
+            return "2 года"  # Стандартная продолжительность магистратуры
         
-        for pattern in duration_patterns:
-            match = re.search(pattern, full_text.lower())
-            if match:
-                return f"{match.group(1)} года"
+        # Более приоритетный паттерн мог совпасть дальше по тексту - проверяем только их
+        priority = int(match.lastgroup[1:])
+        for pattern in DURATION_PATTERNS[:priority]:
+            earlier_match = pattern.search(text_lower)
+            if earlier_match:
+                return f"{earlier_match.group(1)} года"
         
-        return "2 года"  # Стандартная продолжительность магистратуры
+        # Число лет - первая группа внутри сработавшей альтернативы
+        return f"{match.group(DURATION_UNION.groupindex[match.lastgroup] + 1)} года"
     
-    def _extract_admission_requirements(self, full_text: str, paragraphs: List[str]) -> List[str]:
+    def _extract_admission_requirements(self, full_text: str, paragraphs: List[str],
+                                        paragraphs_lower: Optional[List[str]] = None) -> List[str]:
         """Извлечение требований к поступлению"""
         
         requirements = []
         
-        # Ключевые слова для поиска требований
-        requirement_keywords = [
-            'требования', 'поступление', 'вступительные', 'испытания',
-            'экзамен', 'конкурс', 'отбор'
-        ]
-        
-        text_lower = full_text.lower()
+        if paragraphs_lower is None:
+            paragraphs_lower = [paragraph.lower() for paragraph in paragraphs]
         
         # Ищем секции с требованиями
-        for i, paragraph in enumerate(paragraphs):
-            paragraph_lower = paragraph.lower()
-            
-            if any(keyword in paragraph_lower for keyword in requirement_keywords):
-                # Собираем следующие несколько параграфов как требования
-                for j in range(i, min(i + 3, len(paragraphs))):
-                    next_paragraph = paragraphs[j].strip()
+        for i, paragraph_lower in enumerate(paragraphs_lower):
+            if REQUIREMENT_RE.search(paragraph_lower):
+                # Собираем следующие несколько параграфов как требования (параграфы уже без пробелов по краям)
+                for next_paragraph in paragraphs[i:i + 3]:
                     if len(next_paragraph) > 20 and not self._is_header(next_paragraph):
                         requirements.append(next_paragraph)
                 break
@@ -193,27 +488,24 @@ class DocxParser:
         
         return requirements
     
-    def _extract_career_prospects(self, full_text: str, paragraphs: List[str]) -> List[str]:
+    def _extract_career_prospects(self, full_text: str, paragraphs: List[str],
+                                  paragraphs_lower: Optional[List[str]] = None) -> List[str]:
         """Извлечение карьерных перспектив"""
         
         prospects = []
         
-        # Ключевые слова для карьерных перспектив
-        career_keywords = [
-            'карьера', 'трудоустройство', 'работа', 'профессия', 
-            'деятельность', 'специалист', 'должность'
-        ]
+        if paragraphs_lower is None:
+            paragraphs_lower = [paragraph.lower() for paragraph in paragraphs]
         
         # Ищем секции с карьерными перспективами
-        for i, paragraph in enumerate(paragraphs):
-            paragraph_lower = paragraph.lower()
-            
-            if any(keyword in paragraph_lower for keyword in career_keywords):
-                # Извлекаем должности и специальности
-                for j in range(i, min(i + 3, len(paragraphs))):
-                    next_paragraph = paragraphs[j]
-                    career_items = self._extract_career_items(next_paragraph)
+        processed_until = 0  # Параграфы до этого индекса уже разобраны предыдущими секциями
+        for i, paragraph_lower in enumerate(paragraphs_lower):
+            if CAREER_RE.search(paragraph_lower):
+                # Извлекаем должности и специальности (перекрывающиеся окна не разбираем повторно)
+                for j in range(max(i, processed_until), min(i + 3, len(paragraphs))):
+                    career_items = self._extract_career_items(paragraphs[j])
                     prospects.extend(career_items)
+                processed_until = i + 3
         
         # Стандартные перспективы на основе названия программы
         if not prospects:
@@ -234,22 +526,14 @@ class DocxParser:
                     "Аналитик данных"
                 ]
         
-        return list(set(prospects))  # Убираем дубликаты
+        return list(dict.fromkeys(prospects))  # Убираем дубликаты, сохраняя порядок
     
     def _extract_career_items(self, text: str) -> List[str]:
         """Извлечение отдельных карьерных позиций из текста"""
         
-        # Паттерны для поиска должностей
-        job_patterns = [
-            r'(\w+\s*){1,3}(?:инженер|менеджер|аналитик|разработчик|специалист|консультант)',
-            r'(?:ML|AI|Data)\s+\w+',
-            r'\w+\s+Scientist',
-            r'Product\s+Manager'
-        ]
-        
         jobs = []
-        for pattern in job_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
+        for pattern in JOB_PATTERNS:
+            matches = pattern.finditer(text)
             for match in matches:
                 job = match.group().strip()
                 if len(job) > 5:
@@ -291,80 +575,35 @@ class DocxParser:
         credits_idx = self._find_column_index(headers, ['кредит', 'з.е', 'зачет'])
         semester_idx = self._find_column_index(headers, ['семестр', 'период'])
         
-        # Обрабатываем строки с данными
-        for row in table_data[1:]:
-            if len(row) > max(name_idx or 0, credits_idx or 0, semester_idx or 0):
-                
-                name = row[name_idx] if name_idx is not None else ""
-                credits = self._parse_credits(row[credits_idx] if credits_idx is not None else "3")
-                semester = row[semester_idx] if semester_idx is not None else "1 семестр"
-                
-                # Фильтрация некачественных названий курсов
-                if name and self._is_valid_course_name(name):
-                    course = Course(
-                        name=name.strip(),
-                        description=f"Курс по программе {program_id}",
-                        credits=credits,
-                        semester=semester,
-                        is_mandatory=True,  # По умолчанию считаем обязательным
-                        program=program_id,
-                        tags=self._generate_course_tags(name),
-                        prerequisites=[]
-                    )
-                    courses.append(course)
-        
-        return courses
-    
-    def _is_valid_course_name(self, name: str) -> bool:
-        """Проверка валидности названия курса"""
-        name = name.strip()
-        
-        # Слишком короткие названия
-        if len(name) < 5:
-            return False
-        
-        # Слишком длинные названия (вероятно захватился лишний текст)
-        if len(name) > 150:
-            return False
-        
-        # Исключаем явно нерелевантные названия
-        invalid_patterns = [
-            'изначально я учился',
-            'вступительные испытания',
-            'основные даты',
-            'показать все',
-            'http',
-            'www',
-            'подробнее',
-            'читать далее',
-            '20241/5',  # Рейтинги и даты
-            'никита борисов',  # Имена людей
-            'ai talent hub'  # Названия программ
-        ]
+        # Без колонки с названием курсов в таблице нет
+        if name_idx is None:
+            return courses
         
-        name_lower = name.lower()
-        for pattern in invalid_patterns:
-            if pattern in name_lower:
-                return False
-        
-        # Проверяем на наличие признаков настоящего курса
-        course_indicators = [
-            'анализ', 'программирование', 'алгоритм', 'метод', 'основы',
-            'введение', 'технология', 'система', 'обработка', 'разработка',
-            'математика', 'статистика', 'машинное', 'глубокое', 'обучение',
-            'искусственный', 'интеллект', 'данные', 'python', 'практика',
-            'теория', 'моделирование', 'проектирование', 'информатика'
-        ]
+        # Строки с данными, в которых есть все нужные колонки
+        row_length = max(name_idx, credits_idx or 0, semester_idx or 0) + 1
+        rows = [row for row in table_data[1:] if len(row) >= row_length]
         
-        # Если есть хотя бы один индикатор курса - считаем валидным
-        if any(indicator in name_lower for indicator in course_indicators):
-            return True
+        # Раскладываем таблицу по колонкам и проходим их параллельно
+        names = [row[name_idx] for row in rows]
+        credits_column = [row[credits_idx] for row in rows] if credits_idx is not None else ["3"] * len(rows)
+        semesters = [row[semester_idx] for row in rows] if semester_idx is not None else ["1 семестр"] * len(rows)
         
-        # Если название состоит только из заглавных букв - может быть аббревиатурой курса
-        if name.isupper() and 10 <= len(name) <= 50:
-            return True
+        for name, credits_str, semester in zip(names, credits_column, semesters):
+            # Фильтрация некачественных названий курсов
+            if name and _classify_course_name(name) != 'invalid':
+                course = Course(
+                    name=name.strip(),
+                    description=f"Курс по программе {program_id}",
+                    credits=self._parse_credits(credits_str),
+                    semester=semester,
+                    is_mandatory=True,  # По умолчанию считаем обязательным
+                    program=program_id,
+                    tags=self._generate_course_tags(name),
+                    prerequisites=[]
+                )
+                courses.append(course)
         
-        return False
+        return courses
     
     def _find_column_index(self, headers: List[str], keywords: List[str]) -> Optional[int]:
         """Поиск индекса колонки по ключевым словам"""
@@ -375,7 +614,7 @@ class DocxParser:
     
     def _parse_credits(self, credits_str: str) -> int:
         """Парсинг количества кредитов"""
-        numbers = re.findall(r'\d+', credits_str)
+        numbers = CREDITS_RE.findall(credits_str)
         if numbers:
             credits = int(numbers[0])
             return credits if 1 <= credits <= 12 else 3
@@ -389,7 +628,7 @@ class DocxParser:
         # Ищем списки курсов в тексте
         for paragraph in paragraphs:
             # Ищем строки, которые могут быть названиями курсов
-            if self._looks_like_course_name(paragraph):
+            if _classify_course_name(paragraph) == 'text_candidate':
                 course = Course(
                     name=paragraph.strip(),
                     description=f"Курс по программе {program_id}",
@@ -404,116 +643,47 @@ class DocxParser:
         
         return courses
     
-    def _looks_like_course_name(self, text: str) -> bool:
-        """Проверка, похож ли текст на название курса"""
-        
-        course_indicators = [
-            'анализ', 'программирование', 'алгоритм', 'метод', 'основы',
-            'введение', 'технология', 'система', 'обработка', 'разработка'
-        ]
-        
-        text_lower = text.lower()
-        
-        return (20 <= len(text) <= 150 and
-                any(indicator in text_lower for indicator in course_indicators) and
-                not self._is_header(text))
-    
     def _generate_course_tags(self, course_name: str) -> List[str]:
         """Генерация тегов для курса"""
-        
-        tags = []
-        name_lower = course_name.lower()
-        
-        # Основные теги на основе ключевых слов
-        tag_keywords = {
-            'Machine Learning': [
-                'машинное обучение', 'machine learning', 'ml', 'автоматическое машинное обучение',
-                'применения машинного обучения', 'введение в мо', 'продвинутое мо'
-            ],
-            'Deep Learning': [
-                'глубокое обучение', 'deep learning', 'нейронные сети', 'neural networks',
-                'основы глубокого обучения', 'глубокие нейронные сети'
-            ],
-            'Computer Vision': [
-                'компьютерное зрение', 'computer vision', 'cv', 'обработка изображений',
-                'распознавание образов', 'image processing', 'генерация изображений',
-                'обработка и генерация изображений', 'визуальный', 'изображение'
-            ],
-            'NLP': [
-                'обработка естественного языка', 'natural language processing', 'nlp',
-                'анализ текста', 'text mining', 'обработка языка', 'лингвистика',
-                'языковые модели', 'текстовый анализ'
-            ],
-            'Data Science': [
-                'data science', 'анализ данных', 'большие данные', 'big data',
-                'статистика', 'analytics', 'математическая статистика',
-                'анализ и обработка данных', 'визуализация данных'
-            ],
-            'Python': [
-                'python', 'программирование на python', 'python backend',
-                'разработка веб-приложений (python backend)', 'введение в мо (python)',
-                'продвинутое мо (python)'
-            ],
-            'Programming': [
-                'программирование', 'разработка', 'веб-приложений', 'backend',
-                'программирование на с++', 'алгоритмы и структуры данных'
-            ],
-            'Research': [
-                'исследования', 'research', 'научная работа', 'методология',
-                'анализ', 'теория', 'фундаментальные'
-            ],
-            'Algorithms': [
-                'алгоритм', 'структуры данных', 'алгоритмы и структуры данных',
-                'оптимизация', 'complexity'
-            ],
-            'Math': [
-                'математика', 'математическая', 'статистика', 'probability', 'вероятность',
-                'линейная алгебра', 'linear algebra', 'математическая статистика'
-            ],
-            'Recommender Systems': [
-                'рекомендательные системы', 'рекомендации', 'recommender systems',
-                'персонализация', 'collaborative filtering'
-            ],
-            'Web Development': [
-                'веб-разработка', 'web development', 'веб-приложения', 'backend',
-                'frontend', 'разработка веб-приложений'
-            ]
-        }
-        
-        # Ищем совпадения с ключевыми словами
-        for tag, keywords in tag_keywords.items():
-            for keyword in keywords:
-                if keyword in name_lower:
-                    tags.append(tag)
-                    break  # Достаточно одного совпадения для добавления тега
-        
-        # Убираем дубликаты и возвращаем
-        return list(set(tags))
+        return list(_generate_course_tags_cached(course_name))
     
-    def parse_all_docx_files(self, directory: str = ".") -> List[Program]:
-        """Парсинг всех .docx файлов в директории"""
+    def parse_all_docx_files(self, directory: str = ".", max_workers: Optional[int] = None) -> List[Program]:
+        """Парсинг всех .docx файлов в директории (файлы разбираются параллельно в отдельных процессах)"""
         
         programs = []
         
-        # Ищем все .docx файлы
-        docx_files = []
-        for filename in os.listdir(directory):
-            if filename.endswith('.docx') and not filename.startswith('~'):
-                docx_files.append(os.path.join(directory, filename))
-        
-        logger.info(f"Найдено {len(docx_files)} документов для парсинга")
+        # Ищем все .docx файлы (scandir отдает путь и тип файла без лишних системных вызовов)
+        with os.scandir(directory) as entries:
+            docx_files = [
+                entry.path for entry in entries
+                if entry.name.endswith('.docx') and not entry.name.startswith('~') and entry.is_file()
+            ]
         
-        # Парсим каждый файл
-        for file_path in docx_files:
-            program = self.parse_docx_file(file_path)
-            if program:
-                programs.append(program)
-                logger.info(f"Успешно спарсена программа: {program.name}")
+        logger.info("Найдено %d документов для парсинга", len(docx_files))
+        
+        if not docx_files:
+            return programs
+        
+        # Разбор файла - CPU-bound работа без общего состояния, поэтому каждый файл в своем процессе
+        workers = min(max_workers or os.cpu_count() or 1, len(docx_files))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Логирование только в родительском процессе: при запуске через spawn
+            # рабочие процессы не наследуют его настройку, и их записи терялись бы
+            results = executor.map(self._parse_docx_file_in_worker, docx_files)
+            for file_path, (program, error) in zip(docx_files, results):
+                logger.info("Парсинг файла: %s", file_path)
+                if error is not None:
+                    logger.error("Ошибка при парсинге файла %s: %s", file_path, error)
+                elif program:
+                    programs.append(program)
+                    logger.info("Успешно спарсена программа: %s", program.name)
         
         return programs
 
 # Пример использования
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    
     parser = DocxParser()
     programs = parser.parse_all_docx_files(".")
     
@@ -1,25 +1,138 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 import json
-import time
+import asyncio
+import dbm
+import functools
+import shelve
+import threading
 import logging
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, asdict
 import re
 
+# orjson сериализует dataclass-словари в байты в разы быстрее стандартного json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# C-парсер lxml строит дерево в разы быстрее встроенного html.parser
+try:
+    import lxml.html
+    from lxml import etree
+    HTML_PARSER = 'lxml'
+    # Таблицы учебного плана обходятся скомпилированными XPath-выражениями
+    TABLES_XPATH = etree.XPath('//table')
+    TABLE_ROWS_XPATH = etree.XPath('.//tr')
+    ROW_CELLS_XPATH = etree.XPath('.//td | .//th')
+    # Видимый текст страницы: как и get_text() BeautifulSoup, без содержимого script, style и template
+    PAGE_TEXT_XPATH = etree.XPath(
+        '//text()[not(ancestor::script or ancestor::style or ancestor::template)]',
+        smart_strings=False
+    )
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
 from config import (
     ITMO_AI_URL, 
     ITMO_AI_PRODUCT_URL, 
     REQUEST_TIMEOUT, 
-    DELAY_BETWEEN_REQUESTS,
-    JSON_DATA_PATH
+    JSON_DATA_PATH,
+    HTTP_CACHE_PATH
 )
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Регулярные выражения компилируются один раз при импорте
+DIGITS_RE = re.compile(r'\d+')
+CREDITS_RE = re.compile(r'\b(\d+)\b')
+REQUIREMENTS_RE = re.compile(r'(требования|поступление|admission)', re.I)
+
+HTTP_POOL_SIZE = 4  # Обе страницы программ на одном хосте abit.itmo.ru
+HTTP_CHUNK_SIZE = 64 * 1024  # Размер части тела ответа, передаваемой парсеру при потоковой загрузке
+CHARSET_RE = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+
+# Ключевые слова карьерных секций одним шаблоном - один обход DOM вместо прохода на каждое слово
+CAREER_KEYWORDS = ['карьера', 'работа', 'трудоустройство', 'профессия', 'career']
+CAREER_RE = re.compile('|'.join(CAREER_KEYWORDS), re.I)
+
+# Ключевые слова названий курсов и соответствующие теги
+KEYWORD_TAGS = {
+    'машинное обучение': ['ML', 'Machine Learning'],
+    'machine learning': ['ML', 'Machine Learning'],
+    'глубокое обучение': ['Deep Learning', 'Neural Networks'],
+    'deep learning': ['Deep Learning', 'Neural Networks'],
+    'нейронные сети': ['Neural Networks', 'Deep Learning'],
+    'neural networks': ['Neural Networks', 'Deep Learning'],
+    'python': ['Python', 'Programming'],
+    'программирование': ['Programming', 'Development'],
+    'data': ['Data Science', 'Analytics'],
+    'данные': ['Data Science', 'Analytics'],
+    'алгоритм': ['Algorithms', 'CS'],
+    'статистика': ['Statistics', 'Math'],
+    'математика': ['Math', 'Statistics'],
+    'computer vision': ['Computer Vision', 'CV'],
+    'компьютерное зрение': ['Computer Vision', 'CV'],
+    'nlp': ['NLP', 'Text Processing'],
+    'обработка языка': ['NLP', 'Text Processing'],
+    'reinforcement learning': ['RL', 'Reinforcement Learning'],
+    'обучение с подкреплением': ['RL', 'Reinforcement Learning']
+}
+# Все ключевые слова за один проход по названию; просмотр вперед находит и перекрывающиеся вхождения
+KEYWORD_TAGS_RE = re.compile(
+    '(?=(' + '|'.join(re.escape(keyword) for keyword in sorted(KEYWORD_TAGS, key=len, reverse=True)) + '))'
+)
+
+# Первое число в первой строке, где упоминается продолжительность обучения
+DURATION_LINE_RE = re.compile(r'^(?=[^\n]*(?:срок|продолжительность|длительность|года|лет))[^\n]*?(\d+)', re.M)
+
+# Ключевые слова обязательных и выборных курсов
+MANDATORY_KEYWORDS = ['обязательный', 'mandatory', 'required', 'базовый']
+OPTIONAL_KEYWORDS = ['выборный', 'optional', 'elective', 'элективный']
+
+# Строки учебного плана часто повторяются (шаблонные строки, повторы заголовков),
+# поэтому разбор текстов ячеек кэшируется по кортежу этих текстов
+
+@functools.lru_cache(maxsize=1024)
+def _extract_credits_cached(cell_texts: Tuple[str, ...]) -> int:
+    """Извлечение количества кредитов из текстов ячеек"""
+    for text in cell_texts:
+        # Ищем числа, которые могут быть кредитами; первое подходящее завершает поиск
+        for match in CREDITS_RE.finditer(text):
+            credits = int(match.group(1))
+            if 1 <= credits <= 12:  # Разумный диапазон для кредитов
+                return credits
+    return 3  # Значение по умолчанию
+
+@functools.lru_cache(maxsize=1024)
+def _extract_semester_cached(cell_texts_lower: Tuple[str, ...]) -> str:
+    """Извлечение семестра из текстов ячеек в нижнем регистре"""
+    for text in cell_texts_lower:
+        if 'семестр' in text or 'semester' in text:
+            numbers = DIGITS_RE.findall(text)
+            if numbers:
+                return f"{numbers[0]} семестр"
+    
+    # Пытаемся определить по позиции в таблице
+    return "1 семестр"  # Значение по умолчанию
+
+@functools.lru_cache(maxsize=1024)
+def _is_mandatory_cached(text: str) -> bool:
+    """Определение обязательности курса по тексту строки в нижнем регистре"""
+    if any(keyword in text for keyword in OPTIONAL_KEYWORDS):
+        return False
+    if any(keyword in text for keyword in MANDATORY_KEYWORDS):
+        return True
+        
+    # По умолчанию считаем обязательным
+    return True
+
+@dataclass(slots=True)
 class Course:
     name: str
     description: str
@@ -30,7 +143,7 @@ class Course:
     tags: List[str]
     prerequisites: List[str]
 
-@dataclass
+@dataclass(slots=True)
 class Program:
     name: str
     description: str
@@ -41,56 +154,147 @@ class Program:
 
 class ITMOParser:
     def __init__(self):
+        # Keep-alive соединения: вторая страница загружается без нового TCP/TLS-рукопожатия,
+        # временные ошибки сервера повторяются с нарастающей паузой
         self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE,
+            pool_maxsize=HTTP_POOL_SIZE,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504))
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
+        # shelve не потокобезопасен, а программы парсятся параллельно
+        self._cache_lock = threading.Lock()
         
+    def _load_cache_entry(self, url: str) -> Optional[Dict]:
+        """Чтение записи HTTP-кэша для URL"""
+        try:
+            with self._cache_lock, shelve.open(HTTP_CACHE_PATH) as cache:
+                return cache.get(url)
+        except Exception as e:
+            # Поврежденная или устаревшая запись не должна мешать обычной загрузке
+            logger.warning(f"Не удалось прочитать HTTP-кэш: {e}")
+            return None
+    
+    def _store_cache_entry(self, url: str, entry: Dict):
+        """Сохранение записи HTTP-кэша для URL"""
+        try:
+            with self._cache_lock, shelve.open(HTTP_CACHE_PATH) as cache:
+                cache[url] = entry
+        except dbm.error as e:
+            logger.warning(f"Не удалось сохранить HTTP-кэш: {e}")
+    
     def get_page_content(self, url: str) -> Optional[BeautifulSoup]:
         """Получение содержимого страницы"""
         try:
             response = self.session.get(url, timeout=REQUEST_TIMEOUT)
             response.raise_for_status()
-            return BeautifulSoup(response.content, 'html.parser')
+            return BeautifulSoup(response.content, HTML_PARSER)
         except requests.RequestException as e:
             logger.error(f"Ошибка при получении страницы {url}: {e}")
             return None
     
+    def _parse_program_page(self, url: str, program_id: str, program_name: str) -> Optional[Program]:
+        """Условный GET страницы программы: при 304 возвращается ранее разобранная программа"""
+        cached = self._load_cache_entry(url)
+        headers = {}
+        if cached:
+            if cached.get('etag'):
+                headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                headers['If-Modified-Since'] = cached['last_modified']
+        
+        try:
+            response = self.session.get(url, timeout=REQUEST_TIMEOUT, headers=headers, stream=True)
+            with response:
+                response.raise_for_status()
+                
+                # Страница не изменилась - ни загрузки тела, ни разбора HTML
+                if response.status_code == 304 and cached:
+                    logger.info(f"Страница {url} не изменилась, используем кэш")
+                    return cached['program']
+                
+                content, root = self._read_page(response)
+        except requests.RequestException as e:
+            logger.error(f"Ошибка при получении страницы {url}: {e}")
+            return None
+        
+        soup = BeautifulSoup(content, HTML_PARSER)
+        if HTML_PARSER == 'lxml' and root is None:
+            # Кодировка берется из разбора BeautifulSoup: без meta charset lxml читал бы байты как latin-1
+            root = lxml.html.fromstring(
+                content,
+                parser=lxml.html.HTMLParser(encoding=soup.original_encoding)
+            )
+        program = self._extract_program_data(soup, program_id, program_name, root)
+        
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self._store_cache_entry(url, {
+                'etag': etag,
+                'last_modified': last_modified,
+                'program': program
+            })
+        
+        return program
+    
+    def _read_page(self, response: requests.Response) -> Tuple[bytes, Optional[object]]:
+        """Чтение тела ответа: при известной кодировке части разбираются lxml по мере загрузки"""
+        charset = CHARSET_RE.search(response.headers.get('Content-Type', ''))
+        if HTML_PARSER != 'lxml' or not charset:
+            return response.content, None
+        
+        try:
+            parser = lxml.html.HTMLParser(encoding=charset.group(1))
+        except LookupError:
+            return response.content, None
+        
+        chunks = []
+        for chunk in response.iter_content(chunk_size=HTTP_CHUNK_SIZE):
+            parser.feed(chunk)
+            chunks.append(chunk)
+        
+        return b''.join(chunks), parser.close()
+    
     def parse_ai_program(self) -> Optional[Program]:
         """Парсинг программы 'Искусственный интеллект'"""
         logger.info("Парсинг программы 'Искусственный интеллект'...")
-        soup = self.get_page_content(ITMO_AI_URL)
-        if not soup:
-            return None
-            
-        return self._extract_program_data(soup, "AI", "Искусственный интеллект")
+        return self._parse_program_page(ITMO_AI_URL, "AI", "Искусственный интеллект")
     
     def parse_ai_product_program(self) -> Optional[Program]:
         """Парсинг программы 'AI-продукты'"""
         logger.info("Парсинг программы 'AI-продукты'...")
-        soup = self.get_page_content(ITMO_AI_PRODUCT_URL)
-        if not soup:
-            return None
-            
-        return self._extract_program_data(soup, "AI_Product", "AI-продукты")
+        return self._parse_program_page(ITMO_AI_PRODUCT_URL, "AI_Product", "AI-продукты")
     
-    def _extract_program_data(self, soup: BeautifulSoup, program_id: str, program_name: str) -> Program:
+    def _extract_program_data(self, soup: BeautifulSoup, program_id: str, program_name: str, root=None) -> Program:
         """Извлечение данных программы из HTML"""
         
         # Извлечение описания программы
         description = self._extract_description(soup)
         
         # Извлечение продолжительности обучения
-        duration = self._extract_duration(soup)
+        if root is not None:
+            # Текст дерева lxml читается потоково до первого совпадения, без сборки всей страницы в строку
+            page_text_lower = None
+            duration = self._extract_duration_streaming(root)
+        else:
+            # Текст страницы извлекается один раз для всех помощников
+            page_text_lower = soup.get_text().lower()
+            duration = self._extract_duration(soup, page_text_lower)
         
         # Извлечение требований к поступлению
         admission_requirements = self._extract_admission_requirements(soup)
         
         # Извлечение карьерных перспектив
-        career_prospects = self._extract_career_prospects(soup)
+        career_prospects = self._extract_career_prospects(soup, page_text_lower)
         
         # Извлечение курсов
-        courses = self._extract_courses(soup, program_id)
+        courses = self._extract_courses(soup, program_id, root)
         
         return Program(
             name=program_name,
@@ -127,40 +331,59 @@ class ITMOParser:
                 
         return "Описание программы не найдено"
     
-    def _extract_duration(self, soup: BeautifulSoup) -> str:
+    def _extract_duration(self, soup: BeautifulSoup, page_text_lower: Optional[str] = None) -> str:
         """Извлечение продолжительности обучения"""
-        # Ищем информацию о продолжительности
-        duration_keywords = ['срок', 'продолжительность', 'длительность', 'года', 'лет']
-        
-        text = soup.get_text().lower()
-        lines = text.split('\n')
-        
-        for line in lines:
-            if any(keyword in line for keyword in duration_keywords):
-                # Ищем цифры в строке
-                numbers = re.findall(r'\d+', line)
-                if numbers:
-                    return f"{numbers[0]} года"
+        if page_text_lower is None:
+            page_text_lower = soup.get_text().lower()
+        
+        # Ищем первую строку с упоминанием продолжительности и числом - один проход по тексту
+        match = DURATION_LINE_RE.search(page_text_lower)
+        if match:
+            return f"{match.group(1)} года"
                     
         return "2 года"  # Значение по умолчанию для магистратуры
     
+    def _extract_duration_streaming(self, root) -> str:
+        """Извлечение продолжительности обучения потоковым обходом текстовых узлов lxml"""
+        # Строка страницы может состоять из нескольких узлов, поэтому проверяются только завершенные строки
+        pending = ''
+        for text in PAGE_TEXT_XPATH(root):
+            if '\n' not in text:
+                pending += text
+                continue
+            
+            complete, _, rest = text.rpartition('\n')
+            match = DURATION_LINE_RE.search((pending + complete).lower())
+            if match:
+                return f"{match.group(1)} года"
+            pending = rest
+        
+        match = DURATION_LINE_RE.search(pending.lower())
+        if match:
+            return f"{match.group(1)} года"
+        
+        return "2 года"  # Значение по умолчанию для магистратуры
+    
     def _extract_admission_requirements(self, soup: BeautifulSoup) -> List[str]:
         """Извлечение требований к поступлению"""
         requirements = []
+        seen_requirements = set()
+        seen_lists = set()  # Один список может найтись по нескольким совпадениям
         
         # Ищем секции с требованиями
-        requirement_sections = soup.find_all(text=re.compile(r'(требования|поступление|admission)', re.I))
+        requirement_sections = soup.find_all(string=REQUIREMENTS_RE)
         
         for section in requirement_sections:
             parent = section.parent
             if parent:
-                # Ищем списки рядом с найденным текстом
-                lists = parent.find_next_siblings(['ul', 'ol']) or parent.find_all(['ul', 'ol'])
-                for ul in lists:
-                    items = ul.find_all('li')
-                    for item in items:
+                # Берем ближайший список после найденного текста
+                ul = parent.find_next_sibling(['ul', 'ol'])
+                if ul and id(ul) not in seen_lists:
+                    seen_lists.add(id(ul))
+                    for item in ul.find_all('li'):
                         req = item.get_text(strip=True)
-                        if req and len(req) > 10:
+                        if len(req) > 10 and req not in seen_requirements:
+                            seen_requirements.add(req)
                             requirements.append(req)
         
         # Если не нашли специфичные требования, добавляем общие
@@ -173,163 +396,111 @@ class ITMOParser:
             
         return requirements
     
-    def _extract_career_prospects(self, soup: BeautifulSoup) -> List[str]:
+    def _extract_career_prospects(self, soup: BeautifulSoup, page_text_lower: Optional[str] = None) -> List[str]:
         """Извлечение карьерных перспектив"""
-        prospects = []
-        
-        # Ищем секции с карьерными перспективами
-        career_keywords = ['карьера', 'работа', 'трудоустройство', 'профессия', 'career']
-        text_content = soup.get_text().lower()
-        
-        for keyword in career_keywords:
-            if keyword in text_content:
-                # Находим секции, содержащие эти ключевые слова
-                elements = soup.find_all(text=re.compile(keyword, re.I))
-                for element in elements:
-                    parent = element.parent
-                    if parent:
-                        lists = parent.find_next_siblings(['ul', 'ol']) or parent.find_all(['ul', 'ol'])
-                        for ul in lists:
-                            items = ul.find_all('li')
-                            for item in items:
-                                prospect = item.get_text(strip=True)
-                                if prospect and len(prospect) > 5:
-                                    prospects.append(prospect)
+        prospects = set()
+        seen_lists = set()  # Один список может найтись по нескольким совпадениям
+        
+        # Ищем секции с карьерными перспективами за один обход DOM;
+        # готовый текст страницы, если он есть, позволяет пропустить обход
+        if page_text_lower is None or CAREER_RE.search(page_text_lower):
+            for element in soup.find_all(string=CAREER_RE):
+                parent = element.parent
+                if parent:
+                    # Берем ближайший список после найденного текста
+                    ul = parent.find_next_sibling(['ul', 'ol'])
+                    if ul and id(ul) not in seen_lists:
+                        seen_lists.add(id(ul))
+                        for item in ul.find_all('li'):
+                            prospect = item.get_text(strip=True)
+                            if len(prospect) > 5:
+                                prospects.add(prospect)
         
         # Если не нашли специфичные перспективы, добавляем общие для AI
         if not prospects:
-            prospects = [
+            prospects = {
                 "ML-инженер",
                 "Data Scientist",
                 "AI-разработчик",
                 "Исследователь в области ИИ",
                 "Продуктовый менеджер AI-продуктов"
-            ]
+            }
             
-        return list(set(prospects))  # Убираем дубликаты
+        return list(prospects)
     
-    def _extract_courses(self, soup: BeautifulSoup, program_id: str) -> List[Course]:
-        """Извлечение курсов из учебного плана"""
-        courses = []
-        
-        # Ищем таблицы с учебным планом
-        tables = soup.find_all('table')
+    def _iter_table_rows(self, soup: BeautifulSoup, root=None):
+        """Строки таблиц без заголовков: пары (строка, тексты ячеек)"""
+        # Текст ячейки в обоих путях - непустые фрагменты через пробел, чтобы результат не зависел от парсера
+        if root is not None:
+            # Дерево lxml: ячейки и их текст извлекаются в C
+            for table in TABLES_XPATH(root):
+                for row in TABLE_ROWS_XPATH(table)[1:]:  # Пропускаем заголовок
+                    yield row, tuple(
+                        ' '.join(text.strip() for text in cell.itertext() if text.strip())
+                        for cell in ROW_CELLS_XPATH(row)
+                    )
+            return
         
-        for table in tables:
+        for table in soup.find_all('table'):
             rows = table.find_all('tr')
             for row in rows[1:]:  # Пропускаем заголовок
-                cells = row.find_all(['td', 'th'])
-                if len(cells) >= 2:
-                    course_name = cells[0].get_text(strip=True)
-                    
-                    # Пропускаем пустые строки и заголовки
-                    if not course_name or len(course_name) < 3:
-                        continue
-                        
-                    # Извлекаем кредиты
-                    credits = self._extract_credits(cells)
-                    
-                    # Определяем семестр
-                    semester = self._extract_semester(cells, row)
-                    
-                    # Определяем обязательность курса
-                    is_mandatory = self._is_mandatory_course(course_name, cells)
-                    
-                    # Генерируем теги на основе названия
-                    tags = self._generate_tags(course_name)
-                    
-                    course = Course(
-                        name=course_name,
-                        description=f"Курс по программе {program_id}",
-                        credits=credits,
-                        semester=semester,
-                        is_mandatory=is_mandatory,
-                        program=program_id,
-                        tags=tags,
-                        prerequisites=[]
-                    )
-                    
-                    courses.append(course)
+                yield row, tuple(cell.get_text(' ', strip=True) for cell in row.find_all(['td', 'th']))
+    
+    def _extract_courses(self, soup: BeautifulSoup, program_id: str, root=None) -> List[Course]:
+        """Извлечение курсов из учебного плана"""
+        courses = []
         
+        # Ищем таблицы с учебным планом; текст каждой ячейки извлекается один раз
+        for _, cell_texts in self._iter_table_rows(soup, root):
+            if len(cell_texts) >= 2:
+                course_name = cell_texts[0]
+                
+                # Пропускаем пустые строки и заголовки
+                if not course_name or len(course_name) < 3:
+                    continue
+                    
+                # Нижний регистр и общий текст строки вычисляются один раз для всех проверок
+                cell_texts_lower = tuple(text.lower() for text in cell_texts)
+                
+                # Извлекаем кредиты
+                credits = _extract_credits_cached(cell_texts)
+                
+                # Определяем семестр
+                semester = _extract_semester_cached(cell_texts_lower)
+                
+                # Определяем обязательность курса (название - первая ячейка строки)
+                is_mandatory = _is_mandatory_cached(' '.join(cell_texts_lower))
+                
+                # Генерируем теги на основе названия
+                tags = self._generate_tags(course_name)
+                
+                course = Course(
+                    name=course_name,
+                    description=f"Курс по программе {program_id}",
+                    credits=credits,
+                    semester=semester,
+                    is_mandatory=is_mandatory,
+                    program=program_id,
+                    tags=tags,
+                    prerequisites=[]
+                )
+                
+                courses.append(course)
+    
         # Если не нашли курсы в таблице, ищем в списках
         if not courses:
             courses = self._extract_courses_from_lists(soup, program_id)
             
         return courses
     
-    def _extract_credits(self, cells) -> int:
-        """Извлечение количества кредитов"""
-        for cell in cells:
-            text = cell.get_text(strip=True)
-            # Ищем числа, которые могут быть кредитами
-            numbers = re.findall(r'\b(\d+)\b', text)
-            for num in numbers:
-                if 1 <= int(num) <= 12:  # Разумный диапазон для кредитов
-                    return int(num)
-        return 3  # Значение по умолчанию
-    
-    def _extract_semester(self, cells, row) -> str:
-        """Извлечение семестра"""
-        for cell in cells:
-            text = cell.get_text(strip=True).lower()
-            if 'семестр' in text or 'semester' in text:
-                numbers = re.findall(r'\d+', text)
-                if numbers:
-                    return f"{numbers[0]} семестр"
-        
-        # Пытаемся определить по позиции в таблице
-        return "1 семестр"  # Значение по умолчанию
-    
-    def _is_mandatory_course(self, course_name: str, cells) -> bool:
-        """Определение обязательности курса"""
-        # Ключевые слова для обязательных курсов
-        mandatory_keywords = ['обязательный', 'mandatory', 'required', 'базовый']
-        optional_keywords = ['выборный', 'optional', 'elective', 'элективный']
-        
-        text = ' '.join([cell.get_text(strip=True).lower() for cell in cells])
-        text += ' ' + course_name.lower()
-        
-        if any(keyword in text for keyword in optional_keywords):
-            return False
-        if any(keyword in text for keyword in mandatory_keywords):
-            return True
-            
-        # По умолчанию считаем обязательным
-        return True
-    
     def _generate_tags(self, course_name: str) -> List[str]:
         """Генерация тегов на основе названия курса"""
-        tags = []
-        course_lower = course_name.lower()
-        
-        # Словарь ключевых слов и соответствующих тегов
-        keyword_tags = {
-            'машинное обучение': ['ML', 'Machine Learning'],
-            'machine learning': ['ML', 'Machine Learning'],
-            'глубокое обучение': ['Deep Learning', 'Neural Networks'],
-            'deep learning': ['Deep Learning', 'Neural Networks'],
-            'нейронные сети': ['Neural Networks', 'Deep Learning'],
-            'neural networks': ['Neural Networks', 'Deep Learning'],
-            'python': ['Python', 'Programming'],
-            'программирование': ['Programming', 'Development'],
-            'data': ['Data Science', 'Analytics'],
-            'данные': ['Data Science', 'Analytics'],
-            'алгоритм': ['Algorithms', 'CS'],
-            'статистика': ['Statistics', 'Math'],
-            'математика': ['Math', 'Statistics'],
-            'computer vision': ['Computer Vision', 'CV'],
-            'компьютерное зрение': ['Computer Vision', 'CV'],
-            'nlp': ['NLP', 'Text Processing'],
-            'обработка языка': ['NLP', 'Text Processing'],
-            'reinforcement learning': ['RL', 'Reinforcement Learning'],
-            'обучение с подкреплением': ['RL', 'Reinforcement Learning']
-        }
-        
-        for keyword, keyword_tags_list in keyword_tags.items():
-            if keyword in course_lower:
-                tags.extend(keyword_tags_list)
-        
-        return list(set(tags))  # Убираем дубликаты
+        tags = set()
+        
+        for match in KEYWORD_TAGS_RE.finditer(course_name.lower()):
+            tags.update(KEYWORD_TAGS[match.group(1)])
+        
+        return list(tags)
     
     def _extract_courses_from_lists(self, soup: BeautifulSoup, program_id: str) -> List[Course]:
         """Альтернативный метод извлечения курсов из списков"""
@@ -361,54 +532,29 @@ class ITMOParser:
     
     def save_to_json(self, programs: List[Program], filename: str = "programs_data.json"):
         """Сохранение данных в JSON файл"""
-        data = []
-        for program in programs:
-            program_data = {
-                'name': program.name,
-                'description': program.description,
-                'duration': program.duration,
-                'admission_requirements': program.admission_requirements,
-                'career_prospects': program.career_prospects,
-                'courses': []
-            }
-            
-            for course in program.courses:
-                course_data = {
-                    'name': course.name,
-                    'description': course.description,
-                    'credits': course.credits,
-                    'semester': course.semester,
-                    'is_mandatory': course.is_mandatory,
-                    'program': course.program,
-                    'tags': course.tags,
-                    'prerequisites': course.prerequisites
-                }
-                program_data['courses'].append(course_data)
-            
-            data.append(program_data)
+        data = [asdict(program) for program in programs]
         
         filepath = JSON_DATA_PATH + filename
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            with open(filepath, 'wb') as f:
+                f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        else:
+            with open(filepath, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
         
         logger.info(f"Данные сохранены в {filepath}")
     
+    async def parse_all_programs_async(self) -> List[Program]:
+        """Параллельный парсинг всех программ: страницы загружаются одновременно в рабочих потоках"""
+        results = await asyncio.gather(
+            asyncio.to_thread(self.parse_ai_program),
+            asyncio.to_thread(self.parse_ai_product_program)
+        )
+        return [program for program in results if program]
+    
     def parse_all_programs(self) -> List[Program]:
         """Парсинг всех программ"""
-        programs = []
-        
-        # Парсинг программы AI
-        ai_program = self.parse_ai_program()
-        if ai_program:
-            programs.append(ai_program)
-            time.sleep(DELAY_BETWEEN_REQUESTS)
-        
-        # Парсинг программы AI Product
-        ai_product_program = self.parse_ai_product_program()
-        if ai_product_program:
-            programs.append(ai_product_program)
-        
-        return programs
+        return asyncio.run(self.parse_all_programs_async())
 
 if __name__ == "__main__":
     parser = ITMOParser()
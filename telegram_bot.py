@@ -4,11 +4,19 @@ Telegram бот для абитуриентов ИТМО
 Интеграция с BotHandler для обработки сообщений
 """
 
+import asyncio
 import logging
 import os
 import sys
+import weakref
 from typing import Dict, List, Optional
 
+# Цикл событий на libuv быстрее стандартного на множестве мелких await (не поддерживается на Windows)
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import (
     Application,
@@ -22,7 +30,7 @@ from telegram.ext import (
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src.bot.bot_handler import BotHandler
-from config import TELEGRAM_BOT_TOKEN
+from config import TELEGRAM_BOT_TOKEN, ENABLE_GPT_STREAMING
 
 # Настройка логирования
 logging.basicConfig(
@@ -40,7 +48,70 @@ class ITMOTelegramBot:
         """Инициализация Telegram бота"""
         self.bot_handler = BotHandler()
         self.application = None
+        # Блокировки пользователей: сообщения одного пользователя обрабатываются по порядку
+        self._user_locks = weakref.WeakValueDictionary()
+        
+    def user_lock(self, user_id: int) -> asyncio.Lock:
+        """Блокировка пользователя (сообщения разных пользователей обрабатываются параллельно)"""
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._user_locks[user_id] = lock
+        return lock
+    
+    async def process_message(self, user_id: int, username: str, message: str,
+                              on_partial=None) -> Dict:
+        """Обработка сообщения в рабочем потоке, чтобы запросы к GPT не блокировали других пользователей"""
+        return await asyncio.to_thread(self.bot_handler.process_message, user_id, username, message,
+                                       on_partial)
+    
+    def make_draft_updater(self, update: Update, draft: Dict):
+        """Обработчик частичного ответа GPT: показывает черновик и обновляет его по мере генерации"""
+        loop = asyncio.get_running_loop()
+        
+        def on_partial(text: str) -> None:
+            # Вызывается из потока чтения потока GPT: только планируем обновление, не дожидаясь Telegram
+            loop.call_soon_threadsafe(self.schedule_draft_update, update, draft, text)
+        
+        return on_partial
+    
+    def schedule_draft_update(self, update: Update, draft: Dict, text: str) -> None:
+        """Постановка обновления черновика: пока предыдущее не отправлено, промежуточные тексты отбрасываются"""
+        draft['pending'] = text
+        if draft.get('task') is None:
+            draft['task'] = asyncio.create_task(self.flush_draft(update, draft))
+    
+    async def flush_draft(self, update: Update, draft: Dict) -> None:
+        """Отправка последнего накопленного текста черновика, пока появляются новые"""
+        try:
+            while 'pending' in draft:
+                try:
+                    await self.update_draft(update, draft, draft.pop('pending'))
+                except Exception as e:
+                    logger.warning(f"Не удалось обновить черновик ответа: {e}")
+        finally:
+            draft['task'] = None
+    
+    async def update_draft(self, update: Update, draft: Dict, text: str) -> None:
+        """Отправка или редактирование черновика ответа"""
+        # После обрезки по лимиту сообщения текст черновика больше не меняется
+        if draft.get('truncated'):
+            return
+        if len(text) > 4000:
+            text = text[:4000]
+            draft['truncated'] = True
+        text += " ▌"
         
+        # Telegram отклоняет правку, не меняющую текст
+        if text == draft.get('last_text'):
+            return
+        
+        if 'message' not in draft:
+            draft['message'] = await update.message.reply_text(text)
+        else:
+            await draft['message'].edit_text(text)
+        draft['last_text'] = text
+    
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Обработка команды /start"""
         user = update.effective_user
@@ -49,17 +120,19 @@ class ITMOTelegramBot:
         
         logger.info(f"Пользователь {username} ({user_id}) запустил бота")
         
-        # Обрабатываем через наш BotHandler
-        response = self.bot_handler.process_message(user_id, username, "/start")
-        
-        # Отправляем ответ
-        await self.send_response(update, response)
+        async with self.user_lock(user_id):
+            # Обрабатываем через наш BotHandler
+            response = await self.process_message(user_id, username, "/start")
+            
+            # Отправляем ответ
+            await self.send_response(update, response)
     
     async def help_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Обработка команды /help"""
         user = update.effective_user
-        response = self.bot_handler.process_message(user.id, user.username, "/help")
-        await self.send_response(update, response)
+        async with self.user_lock(user.id):
+            response = await self.process_message(user.id, user.username, "/help")
+            await self.send_response(update, response)
     
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Обработка текстовых сообщений"""
@@ -68,11 +141,25 @@ class ITMOTelegramBot:
         
         logger.info(f"Сообщение от {user.username} ({user.id}): {message_text}")
         
-        # Обрабатываем через наш BotHandler
-        response = self.bot_handler.process_message(user.id, user.username, message_text)
-        
-        # Отправляем ответ
-        await self.send_response(update, response)
+        async with self.user_lock(user.id):
+            # Обрабатываем через наш BotHandler, показывая ответ GPT по мере генерации
+            draft = {}
+            on_partial = self.make_draft_updater(update, draft) if ENABLE_GPT_STREAMING else None
+            response = await self.process_message(user.id, user.username, message_text, on_partial)
+            
+            # Дожидаемся последней правки, чтобы черновик не появился после удаления
+            if draft.get('task') is not None:
+                await draft['task']
+            
+            # Черновик заменяем окончательным ответом с клавиатурой
+            if 'message' in draft:
+                try:
+                    await draft['message'].delete()
+                except Exception as e:
+                    logger.warning(f"Не удалось удалить черновик ответа: {e}")
+            
+            # Отправляем ответ
+            await self.send_response(update, response)
     
     async def send_response(self, update: Update, response: Dict) -> None:
         """Отправка ответа пользователю"""
@@ -102,6 +189,7 @@ class ITMOTelegramBot:
                 # Разбиваем на части
                 parts = self.split_message(text, max_message_length)
                 
+                # Части отправляются по очереди: Telegram не гарантирует порядок одновременных сообщений
                 for i, part in enumerate(parts):
                     # Клавиатуру добавляем только к последнему сообщению
                     current_markup = reply_markup if i == len(parts) - 1 else None
@@ -124,39 +212,30 @@ class ITMOTelegramBot:
             return [text]
         
         parts = []
-        current_part = ""
-        
-        # Разбиваем по абзацам
-        paragraphs = text.split('\n\n')
+        start = 0
+        text_length = len(text)
         
-        for paragraph in paragraphs:
-            if len(current_part + paragraph + '\n\n') <= max_length:
-                current_part += paragraph + '\n\n'
+        # Один проход: срез до последней границы абзаца (или пробела) в пределах лимита
+        while start < text_length:
+            end = start + max_length
+            if end >= text_length:
+                cut = next_start = text_length
             else:
-                if current_part:
-                    parts.append(current_part.strip())
-                    current_part = ""
-                
-                # Если сам параграф слишком длинный, разбиваем его
-                if len(paragraph) > max_length:
-                    words = paragraph.split(' ')
-                    current_paragraph = ""
-                    
-                    for word in words:
-                        if len(current_paragraph + word + ' ') <= max_length:
-                            current_paragraph += word + ' '
-                        else:
-                            if current_paragraph:
-                                parts.append(current_paragraph.strip())
-                            current_paragraph = word + ' '
-                    
-                    if current_paragraph:
-                        current_part = current_paragraph
+                cut = text.rfind('\n\n', start, end + 2)
+                if cut > start:
+                    next_start = cut + 2
                 else:
-                    current_part = paragraph + '\n\n'
-        
-        if current_part:
-            parts.append(current_part.strip())
+                    # Абзац длиннее лимита - режем по словам, в крайнем случае жестко
+                    cut = text.rfind(' ', start, end + 1)
+                    if cut > start:
+                        next_start = cut + 1
+                    else:
+                        cut = next_start = end
+            
+            part = text[start:cut].strip()
+            if part:
+                parts.append(part)
+            start = next_start
         
         return parts
     
@@ -179,8 +258,8 @@ class ITMOTelegramBot:
             print("\n🤖 Получить токен можно у @BotFather в Telegram")
             return
         
-        # Создаем приложение
-        self.application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        # Создаем приложение; обновления разных пользователей обрабатываются параллельно
+        self.application = Application.builder().token(TELEGRAM_BOT_TOKEN).concurrent_updates(True).build()
         
         # Регистрируем обработчики
         self.application.add_handler(CommandHandler("start", self.start_command))
@@ -225,6 +304,10 @@ def main():
     # Создаем директорию для логов если нет
     os.makedirs('logs', exist_ok=True)
     
+    # Цикл событий создается при запуске polling, поэтому политика задается заранее
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    
     try:
         bot = ITMOTelegramBot()
         bot.run()